@@ -0,0 +1,68 @@
+"""
+Hydration microbenchmark. Measures how many documents per second a collection builds from raw server documents, and
+how many memory blocks are allocated to keep the hydrated documents. It runs offline: the client is created with
+connect=False and no command is sent to a server.
+
+    python benchmarks/bench_hydration.py [documents]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from mongo_flask.core.collections import CollectionModel  # noqa: E402
+from mongo_flask.core.fields import StringField, IntegerField, DateField  # noqa: E402
+from mongo_flask.core.wrappers import MongoConnect, MongoDatabase  # noqa: E402
+
+
+class People(CollectionModel):
+    collection_name = 'people'
+    first_name = StringField()
+    last_name = StringField()
+    email = StringField()
+    city = StringField()
+    country = StringField()
+    doc_num = StringField()
+    age = IntegerField()
+    height = IntegerField()
+    weight = IntegerField()
+    birthday = DateField()
+
+
+def raw_documents(count):
+    return [
+        {
+            '_id': ObjectId(), 'first_name': 'John', 'last_name': 'Doe', 'email': f'john{i}@example.com',
+            'city': 'San Juan', 'country': 'PR', 'doc_num': f'doc{i}', 'age': i % 90, 'height': 170, 'weight': 70,
+            'birthday': datetime(1990, 1, 1)
+        }
+        for i in range(count)
+    ]
+
+
+def main(count=100000):
+    database = MongoDatabase(MongoConnect('mongodb://localhost:27017', connect=False), 'benchmarks')
+    collection = People(database)
+    documents = raw_documents(count)
+
+    def hydrate():
+        for document in documents:
+            collection._set_document_fields(document)
+
+    best = min(timeit.repeat(hydrate, number=1, repeat=5))
+    print(f'hydrated {count} documents in {best:.3f}s ({count / best:,.0f} documents/sec)')
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    hydrated = [collection._set_document_fields(document) for document in documents]
+    blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+    print(f'{blocks:,} memory blocks held by {len(hydrated)} hydrated documents ({blocks / count:.1f} per document)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
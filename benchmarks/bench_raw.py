@@ -0,0 +1,91 @@
+"""
+Raw documents microbenchmark. Compares reading two fields of 200-field documents through the eager path, which decodes
+each document into a dict and hydrates every field, with `raw_documents`, which hydrates RawBSONDocuments and decodes
+only the fields that are read. Each path starts from the BSON bytes of the server reply, so the time includes the
+decoding pymongo does. It runs offline: the client is created with connect=False and no command is sent to a server.
+
+    python benchmarks/bench_raw.py [documents]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson  # noqa: E402
+from bson.raw_bson import RawBSONDocument  # noqa: E402
+from mongo_flask.core.collections import CollectionModel  # noqa: E402
+from mongo_flask.core.fields import StringField, IntegerField  # noqa: E402
+from mongo_flask.core.wrappers import MongoConnect, MongoDatabase  # noqa: E402
+
+FIELDS = 200
+
+
+def model(name, raw):
+    attributes = {'collection_name': 'wide', 'raw_documents': raw}
+    for i in range(FIELDS):
+        attributes[f'field{i}'] = StringField() if i % 2 else IntegerField()
+    return type(name, (CollectionModel,), attributes)
+
+
+Wide = model('Wide', raw=False)
+RawWide = model('RawWide', raw=True)
+
+
+def encoded_documents(count):
+    return [
+        bson.encode(dict({'_id': bson.ObjectId()}, **{
+            f'field{i}': f'value {n} of field {i}' if i % 2 else n * i for i in range(FIELDS)
+        }))
+        for n in range(count)
+    ]
+
+
+def main(count=10000):
+    database = MongoDatabase(MongoConnect('mongodb://localhost:27017', connect=False), 'benchmarks')
+    eager, raw = Wide(database), RawWide(database)
+    documents = encoded_documents(count)
+
+    def eager_read(names):
+        def run():
+            for data in documents:
+                document = eager._set_document_fields(bson.decode(data))
+                for name in names:
+                    document[name]
+        return run
+
+    def raw_read(names):
+        def run():
+            for data in documents:
+                document = raw._set_document_fields(RawBSONDocument(data))
+                for name in names:
+                    document[name]
+        return run
+
+    cases = (
+        ('2 leading fields', ('field1', 'field2')),
+        ('2 trailing fields', ('field150', 'field199')),
+        ('every field', tuple(f'field{i}' for i in range(FIELDS))),
+    )
+    for label, names in cases:
+        eager_best = min(timeit.repeat(eager_read(names), number=1, repeat=5))
+        raw_best = min(timeit.repeat(raw_read(names), number=1, repeat=5))
+        print(f'{label:>17}: eager {count / eager_best:>9,.0f} documents/sec, raw {count / raw_best:>9,.0f} '
+              f'documents/sec ({eager_best / raw_best:.1f}x)')
+
+    for label, collection, decode in (('eager', eager, bson.decode), ('raw', raw, RawBSONDocument)):
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        hydrated = []
+        for data in documents:
+            document = collection._set_document_fields(decode(data))
+            document['field1'], document['field2']
+            hydrated.append(document)
+        size = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        tracemalloc.stop()
+        print(f'{label:>5}: {size / len(hydrated):,.0f} bytes held per document after reading 2 fields')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
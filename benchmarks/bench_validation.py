@@ -0,0 +1,44 @@
+"""
+Batch validation microbenchmark. Compares validating a column of values one value at a time, with
+`BaseField.validate`, against `BaseField.validate_batch` on a list and, when NumPy is installed, on a NumPy array.
+One value in a hundred is invalid. It runs offline, no server is needed.
+
+    python benchmarks/bench_validation.py [values]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo_flask.core.batch import numpy  # noqa: E402
+from mongo_flask.core.fields import StringField, IntegerField, DateField  # noqa: E402
+
+
+def columns(count):
+    start = datetime(2000, 1, 1)
+    return (
+        (StringField(required=True), [None if i % 100 == 0 else f'name {i}' for i in range(count)], 'U'),
+        (IntegerField(min_value=0, max_value=120), [i % 150 if i % 100 else -1 for i in range(count)], 'int64'),
+        (DateField(max_value=datetime(2030, 1, 1)), [start + timedelta(days=i % 20000) for i in range(count)],
+         'datetime64[us]'),
+    )
+
+
+def main(count=100000):
+    for field, values, dtype in columns(count):
+        name = field.__class__.__name__
+        per_value = min(timeit.repeat(lambda: [field.validate(value) for value in values], number=1, repeat=5))
+        batch = min(timeit.repeat(lambda: field.validate_batch(values), number=1, repeat=5))
+        line = f'{name}: per value {count / per_value:,.0f}/sec, batch {count / batch:,.0f}/sec ' \
+               f'({per_value / batch:.1f}x)'
+        if numpy is not None and None not in values:
+            array = numpy.array(values, dtype=dtype)
+            vectorized = min(timeit.repeat(lambda: field.validate_batch(array), number=1, repeat=5))
+            line += f', NumPy {count / vectorized:,.0f}/sec ({per_value / vectorized:.1f}x)'
+        print(line)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
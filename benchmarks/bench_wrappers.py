@@ -0,0 +1,43 @@
+"""
+Wrapper access microbenchmark. Measures `client.db.collection` attribute and item access, which builds the
+MongoDatabase and MongoCollection wrappers, and the memory blocks allocated by the accesses. It runs offline: the
+client is created with connect=False and no command is sent to a server.
+
+    python benchmarks/bench_wrappers.py [accesses]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo_flask.core.wrappers import MongoConnect  # noqa: E402
+
+
+def main(count=100000):
+    client = MongoConnect('mongodb://localhost:27017', connect=False)
+
+    def by_attribute():
+        for _ in range(count):
+            client.benchmarks.people
+
+    def by_item():
+        for _ in range(count):
+            client['benchmarks']['people']
+
+    for name, access in (('attribute', by_attribute), ('item', by_item)):
+        best = min(timeit.repeat(access, number=1, repeat=5))
+        print(f'{name} access: {count} in {best:.3f}s ({count / best:,.0f} accesses/sec)')
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    collections = [client.benchmarks.people for _ in range(1000)]
+    blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+    print(f'{blocks:,} memory blocks held by {len(collections)} accesses, '
+          f'{len({id(collection) for collection in collections})} distinct collection objects')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,101 @@
+"""
+Benchmark suite of mongo_flask. It runs offline, on the in-process stand-in of `standin.py`, and needs the
+`benchmarks` extra (`pip install mongo_flask[benchmarks]`):
+
+    pytest benchmarks                                   # 10k documents per query benchmark
+    pytest benchmarks --documents 10000 --documents 1000000
+    pytest benchmarks --benchmark-save=baseline         # stores a baseline in benchmarks/baselines
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:20%
+
+The last command compares the run with the latest stored baseline of the machine and fails when a benchmark got more
+than 20% slower.
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standin  # noqa: E402
+from models import LoadedPeople, People, rows, server_documents  # noqa: E402
+from mongo_flask import MongoFlask  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+DEFAULT_STORAGE = 'file://./.benchmarks'  # The pytest-benchmark default
+
+
+def pytest_addoption(parser):
+    parser.addoption('--documents', action='append', type=int, default=None,
+                     help='Documents in the collection read by the query benchmarks, 10000 by default. Repeat it to '
+                          'run them for several sizes')
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Before pytest-benchmark opens its storage
+    if getattr(config.option, 'benchmark_storage', None) == DEFAULT_STORAGE:
+        config.option.benchmark_storage = f'file://{BASELINES}'
+
+
+@pytest.fixture(scope='module', autouse=True)
+def standin_server():
+    """
+    Routes pymongo to the stand-in while the benchmarks of a module run, so tests outside the suite that run in the
+    same session keep the real pymongo.
+    """
+    with standin.installed():
+        yield
+
+
+def pytest_generate_tests(metafunc):
+    if 'populated' in metafunc.fixturenames:
+        sizes = metafunc.config.getoption('documents') or [10000]
+        metafunc.parametrize('populated', sizes, indirect=True, scope='session', ids=[f'{size}docs' for size in sizes])
+
+
+@pytest.fixture(scope='session')
+def mongo():
+    app = Flask(__name__)
+    app.config['MONGO_URI'] = 'mongodb://localhost:27017/benchmarks'
+    app.config['MONGO_CONNECT'] = False
+    # Session fixtures are set up before the stand-in of the module
+    with standin.installed():
+        mongo = MongoFlask(app)
+        mongo.register_collection(People)
+    return mongo
+
+
+@pytest.fixture(scope='session')
+def people(mongo):
+    return mongo.get_collection('people')
+
+
+@pytest.fixture(scope='session')
+def populated(request, people):
+    """
+    The people collection filled with `request.param` documents.
+    """
+    collection = standin.standin_collection(people)
+    collection.delete_many({})
+    collection.insert_many(server_documents(request.param))
+    return request.param
+
+
+@pytest.fixture(scope='session')
+def loaded_people(mongo):
+    with standin.installed():
+        mongo.register_collection(LoadedPeople)
+    return mongo.get_collection('loaded_people')
+
+
+@pytest.fixture
+def fresh_rows(loaded_people):
+    """
+    Setup of the write benchmarks: empties their collection and returns the arguments of a round, `count` new rows.
+    """
+    def setup(count):
+        standin.standin_collection(loaded_people).delete_many({})
+        return (rows(count),), {}
+    return setup
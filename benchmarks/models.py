@@ -0,0 +1,52 @@
+"""
+Collection classes and documents of the benchmark suite.
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from mongo_flask.core.collections import CollectionModel
+from mongo_flask.core.fields import StringField, IntegerField, DateField
+
+CITIES = ('San Juan', 'Ponce', 'Mayaguez', 'Caguas')
+
+
+class People(CollectionModel):
+    collection_name = 'people'
+    first_name = StringField()
+    last_name = StringField()
+    email = StringField()
+    city = StringField()
+    country = StringField()
+    doc_num = StringField()
+    age = IntegerField(min_value=0, max_value=150)
+    height = IntegerField()
+    weight = IntegerField()
+    birthday = DateField()
+
+
+class LoadedPeople(People):
+    # Collection the write benchmarks load, so they do not change 'people'
+    collection_name = 'loaded_people'
+
+
+def rows(count):
+    """
+    Field values of `count` people, without `_id`.
+    """
+    start = datetime(1950, 1, 1)
+    return [
+        {
+            'first_name': 'John', 'last_name': 'Doe', 'email': f'john{i}@example.com', 'city': CITIES[i % 4],
+            'country': 'PR', 'doc_num': f'doc{i}', 'age': i % 90, 'height': 170, 'weight': 70,
+            'birthday': start + timedelta(days=i % 20000)
+        }
+        for i in range(count)
+    ]
+
+
+def server_documents(count):
+    """
+    `count` people as they come from the server, with an `_id`.
+    """
+    return [dict({'_id': ObjectId()}, **row) for row in rows(count)]
@@ -0,0 +1,152 @@
+"""
+In-process MongoDB stand-in for the benchmark suite. `install()` routes the pymongo collection operations that
+mongo_flask uses to a mongomock client, so the suite runs offline and measures the mongo_flask layers (hydration,
+validation, query building, write batching) on top of a server that answers in constant, local time. It is not a
+general pymongo replacement: only the operations the benchmarks use are routed.
+
+The operations of pymongo's AsyncCollection are routed as well, so the asynchronous collections can be tested without
+a server.
+"""
+from contextlib import contextmanager
+
+import bson
+import mongomock
+from bson.raw_bson import RawBSONDocument
+from mongomock.collection import BulkOperationBuilder
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+CLIENT = mongomock.MongoClient()
+
+# Collection methods answered by the stand-in
+COLLECTION_METHODS = ('find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'delete_one',
+                      'delete_many', 'bulk_write', 'count_documents', 'estimated_document_count', 'aggregate',
+                      'create_indexes', 'index_information', 'drop')
+# AsyncCollection coroutines answered by the stand-in, on top of find
+ASYNC_COLLECTION_METHODS = ('find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'delete_one',
+                            'delete_many', 'bulk_write', 'count_documents', 'estimated_document_count')
+# Options of the pymongo methods that mongomock does not take
+DROPPED_OPTIONS = ('session', 'comment', 'allowDiskUse', 'batchSize', 'bypass_document_validation')
+
+_originals = {}  # (class, attribute) to the pymongo or mongomock attribute it replaces
+
+
+def standin_collection(collection):
+    """
+    The mongomock collection that stands in for `collection`.
+    """
+    return CLIENT[collection.database.name][collection.name]
+
+
+def _call(collection, name, args, kwargs):
+    for option in DROPPED_OPTIONS:
+        kwargs.pop(option, None)
+    result = getattr(standin_collection(collection), name)(*args, **kwargs)
+    if name in ('find', 'find_one', 'aggregate') and collection.codec_options.document_class is RawBSONDocument:
+        # The server sends BSON, which raw collections keep undecoded
+        if name == 'find_one':
+            return None if result is None else RawBSONDocument(bson.encode(result))
+        return (RawBSONDocument(bson.encode(document)) for document in result)
+    return result
+
+
+def _routed(name):
+    def method(self, *args, **kwargs):
+        return _call(self, name, args, kwargs)
+    method.__name__ = name
+    return method
+
+
+def _routed_async(name):
+    async def method(self, *args, **kwargs):
+        return _call(self, name, args, kwargs)
+    method.__name__ = name
+    return method
+
+
+class AsyncCursor:
+    """
+    The cursor of an AsyncCollection find: `async for` and `to_list` over the documents of the stand-in.
+    """
+    def __init__(self, documents):
+        self.__documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.__documents)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def to_list(self, length=None):
+        return list(self.__documents)
+
+
+def _async_find(self, *args, **kwargs):
+    return AsyncCursor(_call(self, 'find', args, kwargs))
+
+
+def _collection_init(self, database, name, create=False, *args, **kwargs):
+    _originals[Collection, '__init__'](self, database, name, False, *args, **kwargs)
+    if create and name not in CLIENT[database.name].list_collection_names():
+        CLIENT[database.name].create_collection(name)
+
+
+def _command(self, command, *args, **kwargs):
+    name = command if isinstance(command, str) else next(iter(command))
+    if name in ('hello', 'isMaster', 'ismaster'):
+        return {'ok': 1.0, 'isWritablePrimary': True, 'maxWriteBatchSize': 100000,
+                'maxBsonObjectSize': 16 * 1024 * 1024, 'maxMessageSizeBytes': 48000000}
+    if name == 'ping':
+        return {'ok': 1.0}
+    raise NotImplementedError(f'The stand-in does not run the {name} command')
+
+
+def _add_update(self, *args, sort=None, **kwargs):
+    # pymongo 4.9 added the sort of update_one requests, which mongomock does not take
+    return _originals[BulkOperationBuilder, 'add_update'](self, *args, **kwargs)
+
+
+def _replace(owner, name, attribute):
+    _originals[owner, name] = getattr(owner, name)
+    setattr(owner, name, attribute)
+
+
+def install():
+    """
+    Routes the pymongo operations to the stand-in. Clients must be created with connect=False.
+    """
+    if _originals:
+        return
+    for name in COLLECTION_METHODS:
+        _replace(Collection, name, _routed(name))
+    for name in ASYNC_COLLECTION_METHODS:
+        _replace(AsyncCollection, name, _routed_async(name))
+    _replace(AsyncCollection, 'find', _async_find)
+    _replace(Collection, '__init__', _collection_init)
+    _replace(Database, 'command', _command)
+    _replace(BulkOperationBuilder, 'add_update', _add_update)
+
+
+def uninstall():
+    for (owner, name), attribute in _originals.items():
+        setattr(owner, name, attribute)
+    _originals.clear()
+
+
+@contextmanager
+def installed():
+    """
+    Routes the pymongo operations to the stand-in inside the block; a stand-in already installed is kept afterwards.
+    """
+    if _originals:
+        yield
+        return
+    install()
+    try:
+        yield
+    finally:
+        uninstall()
@@ -0,0 +1,37 @@
+import bson
+from bson.raw_bson import RawBSONDocument
+
+from bench_raw import RawWide, Wide, encoded_documents
+from models import server_documents
+
+DOCUMENTS = 10000
+WIDE_DOCUMENTS = 1000
+
+
+def test_hydrate_documents(benchmark, people):
+    documents = server_documents(DOCUMENTS)
+    hydrate = people._set_document_fields
+    hydrated = benchmark(lambda: [hydrate(document) for document in documents])
+    assert len(hydrated) == DOCUMENTS
+
+
+def test_read_two_fields_of_wide_documents(benchmark, mongo):
+    documents = encoded_documents(WIDE_DOCUMENTS)
+    hydrate = Wide(mongo.db)._set_document_fields
+
+    def read():
+        for data in documents:
+            document = hydrate(bson.decode(data))
+            document['field1'], document['field2']
+    benchmark(read)
+
+
+def test_read_two_fields_of_raw_wide_documents(benchmark, mongo):
+    documents = encoded_documents(WIDE_DOCUMENTS)
+    hydrate = RawWide(mongo.db)._set_document_fields
+
+    def read():
+        for data in documents:
+            document = hydrate(RawBSONDocument(data))
+            document['field1'], document['field2']
+    benchmark(read)
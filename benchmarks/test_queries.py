@@ -0,0 +1,22 @@
+def test_all(benchmark, people, populated):
+    documents = benchmark(lambda: list(people.all()))
+    assert len(documents) == populated
+
+
+def test_filter(benchmark, people, populated):
+    documents = benchmark(lambda: list(people.filter(city='Ponce')))
+    assert len(documents) == populated // 4
+
+
+def test_filter_query_options(benchmark, people, populated):
+    documents = benchmark(lambda: list(people.filter(city='Ponce').order_by('-age').skip(10).limit(100)))
+    assert len(documents) == min(100, populated // 4 - 10)
+
+
+def test_count(benchmark, people, populated):
+    assert benchmark(people.count, city='Ponce') == populated // 4
+
+
+def test_to_columns(benchmark, people, populated):
+    columns = benchmark(lambda: people.filter(city='Ponce').to_columns('age', 'birthday'))
+    assert len(columns['age']) == populated // 4
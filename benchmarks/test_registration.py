@@ -0,0 +1,5 @@
+from models import People
+
+
+def test_register_collection(benchmark, mongo):
+    assert benchmark(mongo.register_collection, People)
@@ -0,0 +1,24 @@
+import pytest
+
+from models import rows
+
+ROWS = 10000
+
+
+def test_validate_document(benchmark, people):
+    documents = rows(ROWS)
+    errors = benchmark(lambda: [people.validate_document(document) for document in documents])
+    assert not any(errors)
+
+
+def test_validate_batch_list(benchmark, people):
+    ages = [row['age'] for row in rows(ROWS)]
+    validation = benchmark(people.validate_columns, {'age': ages})
+    assert validation['age'].invalid_count == 0
+
+
+def test_validate_batch_numpy(benchmark, people):
+    numpy = pytest.importorskip('numpy')
+    ages = numpy.array([row['age'] for row in rows(ROWS)])
+    validation = benchmark(people.validate_columns, {'age': ages})
+    assert validation['age'].invalid_count == 0
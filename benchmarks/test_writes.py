@@ -0,0 +1,28 @@
+ROWS = 1000
+ROUNDS = 5
+
+
+def test_insert_one(benchmark, loaded_people, fresh_rows):
+    def insert(rows):
+        for row in rows:
+            loaded_people.insert_one(**row)
+    benchmark.pedantic(insert, setup=lambda: fresh_rows(ROWS), rounds=ROUNDS)
+    assert loaded_people.count() == ROWS
+
+
+def test_insert_many(benchmark, loaded_people, fresh_rows):
+    result = benchmark.pedantic(lambda rows: loaded_people.insert_many(rows, batch_size=250),
+                                setup=lambda: fresh_rows(ROWS), rounds=ROUNDS)
+    assert result.inserted_count == ROWS
+
+
+def test_save_many(benchmark, loaded_people, fresh_rows):
+    def changed_documents():
+        (rows,), _ = fresh_rows(ROWS)
+        loaded_people.insert_many(rows)
+        documents = list(loaded_people.all())
+        for document in documents:
+            document['age'] += 1
+        return (documents,), {}
+    benchmark.pedantic(loaded_people.save_many, setup=changed_documents, rounds=ROUNDS)
+    assert loaded_people.count(age=1) == ROWS // 90 + 1
@@ -31,9 +31,11 @@ if sys.version_info.major != __py_version__:
     raise PyVersionInvalid()
 
 from .mongo_flask import MongoFlask
+from .core.responses import stream_json
 
 __all__ = (
     MongoFlask.__name__,
+    stream_json.__name__,
     __version__,
     __author__,
     __description__,
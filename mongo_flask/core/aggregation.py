@@ -0,0 +1,186 @@
+from pymongo import ASCENDING, DESCENDING
+
+from .document import DocumentSet
+from ..errors import FieldException
+
+# Query operators whose value is a list of filters on the same fields
+LOGICAL_OPERATORS = ('$and', '$or', '$nor')
+
+
+class Aggregation:
+    """
+    Chainable aggregation pipeline of a collection. Each stage method returns a new Aggregation, so a pipeline can be
+    extended without changing the original. Iterating the aggregation streams the results from the server cursor;
+    `to_list` loads them into a DocumentSet.
+
+    Field names are validated against the fields the documents have at that point of the pipeline: the declared
+    fields of the collection at first, then the fields produced by `project`, `group` and `lookup`. While the results
+    keep the shape of the collection documents (only `match`, `sort`, `skip`, `limit` and a `project` of declared
+    fields), they are hydrated into Documents; after a reshaping stage they are returned as dictionaries.
+    """
+    def __init__(self, collection, pipeline=(), fields=None, hydrate=True, allow_disk_use=False, batch_size=0):
+        self._collection = collection
+        self._pipeline = list(pipeline)
+        self._fields = frozenset(collection._schema.names) if fields is None else fields
+        self._hydrate = hydrate
+        self._allow_disk_use = allow_disk_use
+        self._batch_size = batch_size
+
+    def __iter__(self):
+        cursor = self._collection.aggregate(self.pipeline, **self._aggregate_options())
+        if not self._hydrate:
+            return iter(cursor)
+        hydrate = self._collection._set_document_fields
+        return (hydrate(document) for document in cursor)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.pipeline}>'
+
+    @property
+    def pipeline(self) -> list:
+        return [dict(stage) for stage in self._pipeline]
+
+    @property
+    def hydrates(self) -> bool:
+        """
+        Whether the results are hydrated into Documents.
+        """
+        return self._hydrate
+
+    def to_list(self) -> DocumentSet:
+        return DocumentSet(self)
+
+    ##########
+    # Stages
+    ##########
+    def match(self, _filter=None, **kwargs):
+        """
+        Adds a `$match` stage with the filter and the keyword arguments.
+        """
+        _filter = dict(_filter or {}, **kwargs)
+        self._validate_filter(_filter)
+        return self._stage({'$match': _filter})
+
+    def project(self, *fields, **expressions):
+        """
+        Adds a `$project` stage that keeps `fields` and adds a field for each keyword argument, computed from its
+        aggregation expression. The results stay hydrated when only declared fields are kept.
+        """
+        for name in fields:
+            self._validate_name(name)
+        for expression in expressions.values():
+            self._validate_expression(expression)
+        projection = dict.fromkeys(fields, 1)
+        projection.update(expressions)
+        kept = frozenset(name.split('.', 1)[0] for name in fields) | frozenset(expressions)
+        return self._stage({'$project': projection}, fields=kept, hydrate=self._hydrate and not expressions)
+
+    def group(self, _id, **accumulators):
+        """
+        Adds a `$group` stage. `_id` is the group key expression, e.g. `'$country'`, and each keyword argument is an
+        accumulator, e.g. `total={'$sum': '$amount'}`.
+        """
+        self._validate_expression(_id)
+        for accumulator in accumulators.values():
+            self._validate_expression(accumulator)
+        stage = {'_id': _id}
+        stage.update(accumulators)
+        return self._stage({'$group': stage}, fields=frozenset(accumulators), hydrate=False)
+
+    def sort(self, *keys):
+        """
+        Adds a `$sort` stage. Each key is a field name, prefixed with `-` for descending order, or a
+        `(field, direction)` pair.
+        """
+        sort = {}
+        for key in keys:
+            if isinstance(key, str):
+                name, direction = (key[1:], DESCENDING) if key.startswith('-') else (key, ASCENDING)
+            else:
+                name, direction = key
+            self._validate_name(name)
+            sort[name] = direction
+        return self._stage({'$sort': sort})
+
+    def skip(self, skip):
+        return self._stage({'$skip': int(skip)})
+
+    def limit(self, limit):
+        return self._stage({'$limit': int(limit)})
+
+    def lookup(self, from_collection, local_field, foreign_field, as_field):
+        """
+        Adds a `$lookup` stage that joins the documents of `from_collection`, a collection name or CollectionModel
+        class, whose `foreign_field` equals `local_field`, into the `as_field` array.
+        """
+        self._validate_name(local_field)
+        if isinstance(from_collection, type):
+            from_collection = from_collection.collection_name
+        stage = {'from': from_collection, 'localField': local_field, 'foreignField': foreign_field, 'as': as_field}
+        fields = self._fields | {as_field} if self._fields is not None else None
+        return self._stage({'$lookup': stage}, fields=fields, hydrate=False)
+
+    ##########
+    # Options
+    ##########
+    def allow_disk_use(self, allow=True):
+        """
+        Lets the server write temporary files for stages that exceed the memory limit, e.g. large `$group` or
+        `$sort` stages.
+        """
+        return self._clone(allow_disk_use=bool(allow))
+
+    def batch_size(self, size):
+        """
+        Sets the number of results the server returns per batch while the aggregation is being iterated.
+        """
+        return self._clone(batch_size=int(size))
+
+    def _aggregate_options(self) -> dict:
+        options = {}
+        if self._allow_disk_use:
+            options['allowDiskUse'] = True
+        if self._batch_size:
+            options['batchSize'] = self._batch_size
+        return options
+
+    def _clone(self, **changes):
+        options = dict(pipeline=self._pipeline, fields=self._fields, hydrate=self._hydrate,
+                       allow_disk_use=self._allow_disk_use, batch_size=self._batch_size)
+        options.update(changes)
+        return self.__class__(self._collection, **options)
+
+    def _stage(self, stage, **changes):
+        return self._clone(pipeline=self._pipeline + [stage], **changes)
+
+    ##########
+    # Validation
+    ##########
+    def _validate_name(self, name):
+        if name == '_id':
+            return
+        if self._fields is not None and name.split('.', 1)[0] not in self._fields:
+            raise FieldException(message=f'{name} is not a field of the documents at this stage of the pipeline')
+
+    def _validate_filter(self, _filter):
+        for name, value in _filter.items():
+            if name in LOGICAL_OPERATORS:
+                for sub_filter in value:
+                    self._validate_filter(sub_filter)
+            elif not name.startswith('$'):  # Other operators, e.g. $expr or $text, are left to the server
+                self._validate_name(name)
+
+    def _validate_expression(self, expression):
+        """
+        Validates the field paths (`'$name'`) used in an aggregation expression.
+        """
+        if isinstance(expression, str):
+            if expression.startswith('$') and not expression.startswith('$$'):
+                self._validate_name(expression[1:])
+        elif isinstance(expression, dict):
+            for operator, value in expression.items():
+                if operator != '$literal':
+                    self._validate_expression(value)
+        elif isinstance(expression, (list, tuple)):
+            for value in expression:
+                self._validate_expression(value)
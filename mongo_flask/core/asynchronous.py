@@ -0,0 +1,156 @@
+from .collections import SchemaMixin
+from .document import Document, DocumentQuery, DocumentSet
+from ..errors import CollectionException, ConcurrencyException, MissingFieldsException
+
+
+class AsyncDocumentSet(DocumentQuery):
+    """
+    Asynchronous counterpart of LazyDocumentSet. `async for` streams the documents, building them from the cursor
+    batches as they arrive, and awaiting the set loads the whole result into a DocumentSet. `order_by`, `skip`,
+    `limit`, `only`, `batch_size` and slicing return a new set whose options are sent to the server.
+    """
+    _empty = False
+
+    def __init__(self, collection, _filter=None, *, projection=None, sort=None, skip=0, limit=0, batch_size=0):
+        self._init_query(collection, _filter, projection, sort, skip, limit, batch_size)
+
+    def __aiter__(self):
+        return self._stream()
+
+    def __await__(self):
+        return self.to_list().__await__()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError(f'{self.__class__.__name__} indices must be slices, await the set to index it')
+        start, stop = item.start or 0, item.stop
+        if item.step is not None or start < 0 or (stop is not None and stop < 0):
+            raise ValueError(f'{self.__class__.__name__} only supports slices with non-negative bounds and no step')
+        # The slice is relative to the current skip/limit window
+        limit = self._limit - start if self._limit else 0
+        if stop is not None:
+            limit = min(limit, stop - start) if limit else stop - start
+        sliced = self._clone(skip=self._skip + start, limit=max(limit, 0))
+        sliced._empty = sliced._empty or (stop is not None and stop <= start) or bool(self._limit and limit <= 0)
+        return sliced
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} (not evaluated)>'
+
+    async def to_list(self) -> DocumentSet:
+        """
+        Loads the whole result into a DocumentSet.
+        """
+        docu_set = DocumentSet()
+        async for document in self._stream():
+            docu_set.append(document)
+        return docu_set
+
+    def _clone(self, **changes):
+        clone = super()._clone(**changes)
+        clone._empty = self._empty
+        return clone
+
+    async def _stream(self):
+        if self._empty:
+            return
+        hydrate = self._collection._set_document_fields
+        cursor = self._collection.collection.find(self._filter, **self._find_options())
+        async for document in cursor:
+            yield hydrate(document)
+
+
+class AsyncCollectionModel(SchemaMixin):
+    """
+    Asynchronous counterpart of a CollectionModel. It is built from a CollectionModel class, so the same model
+    definition (collection name, fields and validators) serves sync and async views, and it is bound to an
+    asynchronous database, e.g. a pymongo AsyncDatabase.
+
+    `get`, `insert_one`, `update_one`, `save` and `delete_one` are coroutines; `all`, `filter` and `find_limit` return an
+    AsyncDocumentSet.
+
+    :param query_cache: The query cache of the sync collection of the model, cleared by the writes so sync reads do not
+        return results older than them
+    :type query_cache: QueryCache
+    """
+    def __init__(self, model_cls, database, query_cache=None):
+        if not model_cls.collection_name:
+            raise CollectionException()
+        if not model_cls._schema.names:
+            raise MissingFieldsException(model_cls)
+        self.model = model_cls
+        self.collection_name = model_cls.collection_name
+        self._schema = model_cls._schema
+        self.document_class = model_cls.document_class
+        self.version_field = model_cls.version_field
+        self.raw_documents = model_cls.raw_documents
+        self.database = database
+        self.query_cache = query_cache
+        if self.raw_documents:
+            self.collection = database.get_collection(self.collection_name,
+                                                      codec_options=self._codec_options(database.codec_options))
+        else:
+            self.collection = database[self.collection_name]
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} of {self.model.__name__}>'
+
+    def invalidate_cache(self):
+        """
+        Clears the query cache of the sync collection, see `CollectionModel.invalidate_cache`.
+        """
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def find_limit(self, limit, *args, **kwargs) -> AsyncDocumentSet:
+        _filter = dict(*args, **kwargs)
+        return AsyncDocumentSet(self, _filter, limit=int(limit))
+
+    def all(self) -> AsyncDocumentSet:
+        return AsyncDocumentSet(self)
+
+    def filter(self, **kwargs) -> AsyncDocumentSet:
+        _filter = dict(**kwargs)
+        return AsyncDocumentSet(self, _filter)
+
+    async def get(self, **kwargs) -> Document:
+        _filter = dict(**kwargs)
+        _document = await self.collection.find_one(_filter, projection=self.projection)
+        return self._set_document_fields(_document)
+
+    async def insert_one(self, session=None, **kwargs):
+        _document = dict(**kwargs)
+        try:
+            return await self.collection.insert_one(_document, session=session)
+        finally:
+            self.invalidate_cache()
+
+    async def update_one(self, document: Document, update: dict, **kwargs):
+        _update = {'$set': update}
+        try:
+            return await self.collection.update_one(self._document_filter(document), _update, **kwargs)
+        finally:
+            self.invalidate_cache()
+
+    async def save(self, document: Document, session=None, **kwargs):
+        """
+        Writes the changed and removed fields of `document`, see `CollectionModel.save`.
+        """
+        save = self._save_update(document)
+        if save is None:
+            return None
+        _filter, update, values = save
+        try:
+            result = await self.collection.update_one(_filter, update, session=session, **kwargs)
+        finally:
+            self.invalidate_cache()
+        if self.version_field and result.acknowledged and not result.matched_count:
+            raise ConcurrencyException()
+        document._written(values)
+        return result
+
+    async def delete_one(self, document: Document, **kwargs):
+        try:
+            return await self.collection.delete_one(self._document_filter(document), **kwargs)
+        finally:
+            self.invalidate_cache()
@@ -0,0 +1,65 @@
+try:
+    import numpy
+except ImportError:  # NumPy is optional, columns may also be lists
+    numpy = None
+
+
+def is_array(values) -> bool:
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def python_value(value):
+    """
+    Converts a NumPy scalar to the equivalent Python value, e.g. numpy.int64 to int.
+    """
+    if numpy is None or not isinstance(value, numpy.generic):
+        return value
+    if isinstance(value, numpy.datetime64):
+        return value.astype('datetime64[us]').item()
+    return value.item()
+
+
+class BatchValidation:
+    """
+    Result of validating a column of values with `BaseField.validate_batch`. `mask` holds one flag per value, set for
+    the invalid values: a NumPy bool array for NumPy columns, a bytearray otherwise.
+
+    The ErrorDetails are only built when `errors` is read, by validating the invalid values again one at a time, so a
+    valid column, or one whose errors are only counted, never builds an ErrorDetail.
+    """
+    def __init__(self, field, values, mask):
+        self.field = field
+        self.values = values
+        self.mask = mask
+        self.__errors = None
+
+    def __len__(self):
+        return len(self.mask)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} values={len(self)} invalid={self.invalid_count}>'
+
+    @property
+    def valid(self) -> bool:
+        return not self.invalid_count
+
+    @property
+    def invalid_count(self) -> int:
+        if is_array(self.mask):
+            return int(self.mask.sum())
+        return self.mask.count(1)
+
+    def invalid_positions(self) -> list:
+        if is_array(self.mask):
+            return numpy.flatnonzero(self.mask).tolist()
+        return [position for position, invalid in enumerate(self.mask) if invalid]
+
+    @property
+    def errors(self) -> dict:
+        """
+        Map of the position of each invalid value to its list of ErrorDetail.
+        """
+        if self.__errors is None:
+            self.__errors = {position: self.field.validate(python_value(self.values[position]))
+                             for position in self.invalid_positions()}
+        return self.__errors
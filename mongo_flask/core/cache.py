@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+MISSING = object()
+
+
+class QueryCache:
+    """
+    Bounded cache of query results. Once `maxsize` results are stored, the least recently used one is evicted; when
+    `ttl` is given, results also expire `ttl` seconds after they were stored. `hits` and `misses` count the lookups.
+
+    `clear` invalidates every result and starts a new generation. A result read from the server before the cache was
+    cleared is not stored (see `put`), so a query racing with a write cannot bring back stale data.
+    """
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.__entries = OrderedDict()  # Key to (expiry time, result)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} size={len(self)}/{self.maxsize} hits={self.hits} misses={self.misses}>'
+
+    def get(self, key, default=MISSING):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                expiry, result = entry
+                if expiry is None or expiry > time.monotonic():
+                    self.__entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self.__entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, result, generation=None):
+        """
+        Stores `result` under `key`.
+
+        :param generation: The generation read before running the query. The result is dropped if the cache was
+            cleared since then.
+        :type generation: int
+        """
+        with self.__lock:
+            if generation is not None and generation != self.generation:
+                return
+            expiry = time.monotonic() + self.ttl if self.ttl else None
+            self.__entries[key] = (expiry, result)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.generation += 1
+
+
+def _freeze(value):
+    # The type is part of the key: 1, 1.0 and True hash alike but are different query values
+    if isinstance(value, Mapping):
+        return dict, tuple((name, _freeze(item)) for name, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return list, tuple(_freeze(item) for item in value)
+    hash(value)
+    return value.__class__, value
+
+
+def query_key(operation, _filter=None, projection=None, sort=None, skip=0, limit=0):
+    """
+    Builds the cache key of a query. The top-level keys of the filter and the projection are sorted, since their order
+    does not change the result; the order of embedded documents and of the sort is kept.
+
+    :return: A hashable key, or None when a value of the query cannot be hashed and the query should not be cached
+    """
+    try:
+        return (
+            operation,
+            tuple(sorted((name, _freeze(value)) for name, value in (_filter or {}).items())),
+            tuple(sorted((name, _freeze(value)) for name, value in (projection or {}).items())),
+            _freeze(sort or ()),
+            skip,
+            limit,
+        )
+    except TypeError:
+        return None
@@ -1,17 +1,33 @@
-from bson import ObjectId
+from collections.abc import Mapping
+from itertools import islice
+from types import MappingProxyType
+from typing import NamedTuple
+
+import bson
+from bson.raw_bson import RawBSONDocument
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .aggregation import Aggregation
+from .cache import MISSING, QueryCache, query_key
 from .wrappers import MongoCollection
-from .document import Document, DocumentSet
-from .fields import BaseField
-from ..errors import MissingFieldsException, CollectionException
+from .document import IMMUTABLE_TYPES, Document, LazyDocumentSet, RawDocument, snapshot
+from .identity import get_identity_map
+from .indexes import IndexReport, declared_indexes, reconcile_indexes
+from .pagination import Page, decode_token, encode_token, field_value, keyset_filter, parse_sort_key
+from .fields import BaseField, ErrorDetail
+from .results import BulkOperationResult, BulkInsertResult
+from ..errors import MissingFieldsException, CollectionException, FieldException, DocumentException, \
+    ConcurrencyException
 
+PIPELINE_OPERATIONS = ('insert_one', 'update_one', 'delete_one')
+DEFAULT_MAX_WRITE_BATCH_SIZE = 100000
 
-class CollectionFields(list):
-    __data = dict()
 
+class CollectionFields(list):
     def __init__(self, **kwargs):
         super().__init__()
-        if kwargs:
-            self.__data.update(**kwargs)
+        self.__data = dict(**kwargs)
 
     def append(self, __object: dict) -> None:
         if not isinstance(__object, dict):
@@ -31,30 +47,223 @@ class CollectionFields(list):
         return self.__data.keys()
 
 
-class BaseCollection(MongoCollection):
+class CollectionSchema(NamedTuple):
+    """
+    Immutable description of the fields declared in a collection class. It is compiled once per class, when the class
+    is created, and shared by every instance of the collection.
+    """
+    names: tuple  # Field names in declaration order
+    fields: tuple  # BaseField instances, aligned with names
+    positions: MappingProxyType  # Field name to position in names
+    projection: MappingProxyType  # Projection of the declared fields
+
+    @classmethod
+    def compile(cls, collection_cls):
+        """
+        Compiles the fields declared in `collection_cls` and its bases.
+
+        :raises FieldException: When a field has the name of another attribute of the class, e.g. `name` or `find`
+            of pymongo's Collection, which the field would hide from the collection methods that use it
+        """
+        declared = {}
+        attributes = set()  # Names of the attributes that are not fields
+        for klass in reversed(collection_cls.__mro__):  # Subclasses override the fields of their bases
+            for name, attr in vars(klass).items():
+                if name.startswith('_'):
+                    continue
+                if isinstance(attr, BaseField):
+                    declared[name] = attr
+                else:
+                    attributes.add(name)
+
+        shadowing = sorted(declared.keys() & attributes)
+        if shadowing:
+            raise FieldException(message=f'Fields {", ".join(shadowing)} of {collection_cls.__name__} shadow attributes '
+                                         f'of the collection', fix='Declare the fields with other names')
+        names = tuple(declared)
+        fields = tuple(declared.values())
+        return cls(
+            names=names,
+            fields=fields,
+            positions=MappingProxyType({name: position for position, name in enumerate(names)}),
+            projection=MappingProxyType({name: 1 for name in names})
+        )
+
+    def items(self):
+        return zip(self.names, self.fields)
+
+
+class SchemaMixin:
+    """
+    Operations that only depend on the compiled schema of a collection class: the default projection, field name
+    and document validation, the write filter of a document and document hydration. Shared by the collection models.
+    """
+    _schema = CollectionSchema.compile(object)
+    document_class = Document
+    version_field = None  # Declared field holding a version number that `save` checks and increments
+    raw_documents = False  # Read RawBSONDocuments and decode each field of a document when it is first read
+    _decode_options = bson.DEFAULT_CODEC_OPTIONS  # Codec options the fields of raw documents are decoded with
+
+    @property
+    def projection(self) -> dict:
+        """
+        Projection of the declared fields. It is sent with every read so only the declared fields come over the wire.
+        """
+        return dict(self._schema.projection)
+
+    def validate_field_name(self, name: str):
+        """
+        Raises FieldException if `name` is not `_id` or a field declared in the collection. Dotted paths are checked
+        by their top level field.
+
+        :param name: Name of the field
+        :type name: str
+        """
+        if name != '_id' and name.split('.', 1)[0] not in self._schema.positions:
+            raise FieldException(message=f'{name} is not a field of {self.__class__.__name__}')
+
+    def _codec_options(self, codec_options):
+        """
+        Codec options to read the collection with. With `raw_documents`, the documents are read as RawBSONDocuments
+        and their fields are decoded with `codec_options`.
+        """
+        if not self.raw_documents:
+            return codec_options
+        if codec_options.document_class is RawBSONDocument:
+            self._decode_options = codec_options.with_options(document_class=dict)
+        else:
+            self._decode_options = codec_options
+        return codec_options.with_options(document_class=RawBSONDocument)
+
+    def _set_document_fields(self, _document=None) -> Document:
+        if self.raw_documents and isinstance(_document, RawBSONDocument):
+            return self.document_class.from_raw(self, _document.raw, self._decode_options)
+        names = self._schema.names
+        if not _document:
+            return self.document_class(self, dict.fromkeys(names))
+        if self.raw_documents:
+            return self.document_class(self, {name: _document.get(name) for name in names}, _id=_document.get('_id'))
+        document = self.document_class(self, _id=_document.get('_id'), initial=_document)
+        for name in names:
+            document[name] = _document.get(name)
+        if not IMMUTABLE_TYPES.issuperset(map(type, _document.values())):
+            # The document gets copies of its lists and embedded documents, `initial` keeps the values of the server
+            for name, value in document.items():
+                document[name] = snapshot(value)
+        return document
+
+    def validate_document(self, document) -> dict:
+        """
+        Validates a document against the declared fields. Fields that are not declared in the collection are errors.
+
+        :param document: The document to validate
+        :type document: dict
+        :return: Map of field name to its list of ErrorDetail, empty if the document is valid
+        """
+        if not isinstance(document, Mapping):
+            return {'__all__': [ErrorDetail(message=f'Document is of type {type(document)} and should be dict',
+                                            fix='Use dictionaries as documents')]}
+        errors = {}
+        for name, field in self._schema.items():
+            field_errors = field.validate(document.get(name))
+            if field_errors:
+                errors[name] = field_errors
+        for name in document:
+            if name != '_id' and name not in self._schema.positions:
+                errors[name] = [ErrorDetail(message=f'{name} is not a field of {self.__class__.__name__}',
+                                            fix='Use a field declared in the CollectionModel class')]
+        return errors
+
+    def validate_columns(self, columns: Mapping) -> dict:
+        """
+        Validates columns of values, e.g. a batch of rows to load, with `BaseField.validate_batch`.
+
+        :param columns: Map of field name to its column of values, a list or a NumPy array
+        :type columns: dict
+        :return: Map of field name to its BatchValidation
+        """
+        validations = {}
+        for name, values in columns.items():
+            position = self._schema.positions.get(name)
+            if position is None:
+                raise FieldException(message=f'{name} is not a field of {self.__class__.__name__}')
+            validations[name] = self._schema.fields[position].validate_batch(values)
+        return validations
+
+    @staticmethod
+    def _document_filter(document: Document) -> dict:
+        """
+        Filter that matches `document` by its `_id`, so writes are primary key lookups.
+        """
+        if document._id is None:
+            raise DocumentException()
+        return {'_id': document._id}
+
+    def _save_update(self, document: Document):
+        """
+        Builds the write of the changes of `document`: the filter, the update with the changed fields in `$set` and
+        the removed ones in `$unset`, and the values the document takes once written. With a version field, the filter
+        also matches the version the document was loaded with, and the update sets the next one.
+
+        :return: (filter, update, values), or None if the document did not change
+        """
+        _filter = self._document_filter(document)
+        changed = document.changed_data()
+        removed = document.removed_fields()
+        version_field = self.version_field
+        if version_field:
+            changed.pop(version_field, None)
+            removed = [name for name in removed if name != version_field]
+        if not changed and not removed:
+            return None
+
+        update, values = {}, {}
+        if changed:
+            update['$set'] = changed
+        if removed:
+            update['$unset'] = dict.fromkeys(removed, '')
+        if version_field:
+            version = document.original(version_field)
+            _filter[version_field] = version  # None also matches a document without the field
+            values[version_field] = (version or 0) + 1
+            update.setdefault('$set', {})[version_field] = values[version_field]
+        return _filter, update, values
+
+
+class BaseCollection(SchemaMixin, MongoCollection):
     __client_session__ = None
     collection_name = None
-    __id = ObjectId()
+    cache_size = 0  # Query results kept in the query cache, 0 disables it
+    cache_ttl = None  # Seconds a cached result is kept, None keeps it until it is evicted or invalidated
+    cache_max_documents = 1000  # Results with more documents are not cached
+    indexes = ()  # pymongo.IndexModel objects, on top of the indexes declared with the field options
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._schema = CollectionSchema.compile(cls)
+        if cls.version_field is not None and cls.version_field not in cls._schema.positions:
+            raise FieldException(message=f'Version field {cls.version_field} is not a field of {cls.__name__}')
+        base = RawDocument if cls.raw_documents else Document
+        cls.document_class = type(f'{cls.__name__}Document', (base,), {'__slots__': (), '_schema': cls._schema})
+        cls._indexes = declared_indexes(cls)
 
     def __init__(self, database, **kwargs):
         if not self.collection_name:
             raise CollectionException()
+        if not self._schema.names:
+            raise MissingFieldsException(self)
+        if self.raw_documents:
+            kwargs['codec_options'] = self._codec_options(kwargs.get('codec_options') or database.codec_options)
         super().__init__(database, self.collection_name, **kwargs)
         self.base_fields = self.__set_base_fields__()
         self.errors = list()
+        self.__max_write_batch_size = None
+        self.query_cache = QueryCache(self.cache_size, self.cache_ttl) if self.cache_size else None
 
     def __set_base_fields__(self):
         base_fields = CollectionFields()
-        non_dunder = [simp for simp in dir(self) if not simp.startswith('__') and not simp.startswith('_')]
-
-        for name in non_dunder:
-            class_attr = getattr(self, name)
-            if not callable(class_attr) and isinstance(class_attr, BaseField):
-                base_fields.append({name: getattr(self, name)})
-
-        if not base_fields:
-            raise MissingFieldsException(self)
-
+        for name, field in self._schema.items():
+            base_fields.append({name: field})
         return base_fields
 
     def __str__(self):
@@ -68,6 +277,34 @@ class BaseCollection(MongoCollection):
     def client_session(self, value):
         self.__client_session__ = value
 
+    def rebind(self, database):
+        """
+        Points the collection to `database`, a database of a new client, keeping the collection options. Used when
+        the client is replaced, e.g. after a fork, so existing references to the collection keep working.
+
+        :param database: The database of the new client
+        :type database: MongoDatabase
+        """
+        self._database = database
+        self.client_session = database.client.start_session
+
+    def ensure_indexes(self, dry_run=False, session=None) -> IndexReport:
+        """
+        Reconciles the indexes declared in the class, with the field `index` and `unique` options and the `indexes`
+        attribute, with the indexes in the server. The missing indexes are created with a single `create_indexes`
+        call; extra and conflicting indexes are only reported.
+
+        :param dry_run: Only report, do not create the missing indexes
+        :type dry_run: bool
+        :param session: Optional client session
+        :return: The missing, extra, conflicting and created indexes
+        """
+        existing = self.index_information(session=session)
+        report = reconcile_indexes(self.collection_name, self._indexes, existing, dry_run=dry_run)
+        if report.missing and not dry_run:
+            report.created = self.create_indexes(report.missing, session=session)
+        return report
+
     @property
     def is_valid(self, raise_exep=False):
         if raise_exep:
@@ -76,83 +313,382 @@ class BaseCollection(MongoCollection):
         else:
             return not self.errors
 
-    def _set_document_fields(self, **_document) -> Document:
-        _doc = {}
-        for field in self.base_fields:
-            name = list(field.keys())[0]
-            field_class = list(field.values())[0]
-            field_class.data = _document.get(name)  # Set the data of the field
-            _doc.update({name: field_class})
-        return Document(self, **_doc)
-
     ##########
     # Collection operations
     ##########
-    def find_limit(self, limit, *args, **kwargs) -> DocumentSet:
+    def find_limit(self, limit, *args, **kwargs) -> LazyDocumentSet:
         """
         Returns a list of the first docs found. The amount returned will be set
-        by `limit`.
+        by `limit`, which is applied by the server.
 
         :param limit: The number of the first documents to retrieved from the entire collection
         :type limit: int
         """
-        docu_set = DocumentSet()
-        int(limit)
-        _filter = {}
-        if kwargs:
-            _filter = dict(**kwargs)
-        cursor = super().find(*args, _filter)
-        for idx, document in enumerate(cursor):
-            _document = self._set_document_fields(**document)
-            docu_set.append(_document)
-            if idx + 1 == limit:
-                break
-        return docu_set
-
-    def all(self) -> DocumentSet:
-        docu_set = DocumentSet()
-        cursor = super().find()
-        for document in cursor:
-            _document = self._set_document_fields(**document)
-            docu_set.append(_document)
-        return docu_set
-
-    def filter(self, **kwargs) -> DocumentSet:
-        docu_set = DocumentSet()
+        _filter = dict(*args, **kwargs)
+        return LazyDocumentSet(self, _filter, limit=int(limit))
+
+    def all(self) -> LazyDocumentSet:
+        """
+        Returns a lazy set of every document in the collection. Documents are fetched and built as the set is
+        iterated.
+        """
+        return LazyDocumentSet(self)
+
+    def filter(self, **kwargs) -> LazyDocumentSet:
+        """
+        Returns a lazy set of the documents that match the keyword arguments. Documents are fetched and built as the
+        set is iterated. Use `order_by`, `skip`, `limit` and `only` on the returned set to refine the query on the
+        server.
+        """
+        _filter = dict(**kwargs)
+        return LazyDocumentSet(self, _filter)
+
+    def aggregation(self) -> Aggregation:
+        """
+        Returns an empty aggregation pipeline of the collection. Add stages with `match`, `project`, `group`, `sort`,
+        `skip`, `limit` and `lookup`, then iterate it to stream the results.
+        """
+        return Aggregation(self)
+
+    def paginate(self, per_page=20, order_by='_id', token=None, **kwargs) -> Page:
+        """
+        Returns a page of the documents that match the keyword arguments, sorted by `order_by` and then by `_id`.
+        Pages are found by the sort value and `_id` of the last document of the previous page, carried in
+        `next_token`, instead of by skipping documents, so every page costs the same. Index the sort key and `_id`
+        together to keep the query an index scan.
+
+        The values of the sort key should share one BSON type; documents with another type are not paged.
+
+        :param per_page: Number of documents per page
+        :type per_page: int
+        :param order_by: Declared field to sort by, prefixed with `-` for descending order
+        :type order_by: str
+        :param token: The `next_token` of the previous page, None for the first page
+        :type token: str
+        """
+        name, direction = parse_sort_key(order_by)
+        self.validate_field_name(name)
+        per_page = int(per_page)
+        if per_page < 1:
+            raise ValueError('per_page must be a positive number')
+
         _filter = dict(**kwargs)
-        cursor = super().find(_filter)
-        for document in cursor:
-            _document = self._set_document_fields(**document)
-            docu_set.append(_document)
-        return docu_set
+        if token:
+            value, _id = decode_token(token, name, direction)
+            after = keyset_filter(name, direction, value, _id)
+            _filter = {'$and': [_filter, after]} if _filter else after
+        sort = [('_id', direction)] if name == '_id' else [(name, direction), ('_id', direction)]
+        documents = list(LazyDocumentSet(self, _filter, sort=sort, limit=per_page + 1))
+        if len(documents) <= per_page:
+            return Page(documents, per_page=per_page)
+
+        last = documents[per_page - 1]
+        value = last._id if name == '_id' else field_value(last, name)
+        return Page(documents[:per_page], encode_token(name, direction, value, last._id), per_page)
 
     def get(self, **kwargs) -> Document:
+        """
+        Returns the first document that matches the keyword arguments. With the identity map enabled, a document
+        already loaded in the application context is returned as is, and `get(_id=...)` does not query the server.
+        """
         _filter = dict(**kwargs)
-        _document = super().find_one(_filter)
-        data = _document if _document else {}
-        document = self._set_document_fields(**data)
+        identity_map = get_identity_map()
+        if identity_map is not None and _filter.keys() == {'_id'}:
+            document = identity_map.get(self, _filter['_id'])
+            if document is not None:
+                return document
+
+        document = self._set_document_fields(self.__find_one(_filter))
+        if identity_map is not None:
+            document = identity_map.merge(self, document)
         return document
 
+    def __find_one(self, _filter):
+        projection = self.projection
+        cache = self.query_cache
+        key = query_key('get', _filter, projection) if cache is not None else None
+        if key is None:
+            return super().find_one(_filter, projection=projection)
+        data = cache.get(key)
+        if data is MISSING:
+            generation = cache.generation
+            document = super().find_one(_filter, projection=projection)
+            cache.put(key, None if document is None else bson.encode(document, codec_options=self.codec_options),
+                      generation)
+            return document
+        return None if data is None else bson.decode(data, self.codec_options)
+
+    def __cached(self, query, operation, _filter, projection=None):
+        """
+        Runs `query`, a function without arguments that returns an immutable value, through the query cache when it
+        is enabled.
+        """
+        cache = self.query_cache
+        key = query_key(operation, _filter, projection) if cache is not None else None
+        if key is None:
+            return query()
+        result = cache.get(key)
+        if result is MISSING:
+            generation = cache.generation
+            result = query()
+            cache.put(key, result, generation)
+        return result
+
+    def count(self, session=None, **kwargs) -> int:
+        """
+        Number of documents that match the keyword arguments, counted by the server with `count_documents`. No
+        document is sent over the wire.
+        """
+        _filter = dict(**kwargs)
+        return self.__cached(lambda: self.count_documents(_filter, session=session), 'count', _filter)
+
+    def estimated_count(self, **kwargs) -> int:
+        """
+        Number of documents in the collection, read from the collection metadata with `estimated_document_count`.
+        It is fast on any collection size but may be off after an unclean shutdown, and it cannot be filtered.
+        """
+        return self.estimated_document_count(**kwargs)
+
+    def exists(self, session=None, **kwargs) -> bool:
+        """
+        Whether a document matches the keyword arguments. The server stops at the first match and only returns its
+        `_id`.
+        """
+        _filter = dict(**kwargs)
+        return self.__cached(lambda: self.find_one(_filter, projection={'_id': 1}, session=session) is not None,
+                             'exists', _filter)
+
+    def _identity_documents(self, documents, register=True):
+        """
+        Replaces the documents already loaded in the identity map of the application context with the loaded ones, and
+        adds the others to the map.
+
+        :param register: Add the documents that are not loaded to the map. Streamed sets, which would otherwise keep
+            every document they read in memory until the context is torn down, and reads with a projection that leaves
+            out declared fields, so `get(_id=...)` never returns a document with missing fields, only look up
+        :type register: bool
+        """
+        identity_map = get_identity_map()
+        if identity_map is None:
+            return documents
+        if not register:
+            return (identity_map.loaded(self, document) for document in documents)
+        return (identity_map.merge(self, document) for document in documents)
+
+    def _find_documents(self, _filter, **options):
+        """
+        Runs a find for the lazy document sets. With the query cache enabled, a result that is read to the end and has
+        at most `cache_max_documents` documents is stored, and later identical queries are served from the cache.
+
+        Results are cached as BSON and decoded again on every hit, so changing a document, or a list or embedded
+        document in it, never changes the cached result.
+        """
+        cache = self.query_cache
+        key = None
+        if cache is not None:
+            key = query_key('find', _filter, options.get('projection'), options.get('sort'), options.get('skip', 0),
+                            options.get('limit', 0))
+        if key is None:
+            return self.find(_filter, **options)
+
+        data = cache.get(key)
+        if data is MISSING:
+            return self.__caching_cursor(cache, key, _filter, options)
+        return bson.decode_iter(data, self.codec_options)
+
+    def __caching_cursor(self, cache, key, _filter, options):
+        generation = cache.generation
+        encoded, codec_options = [], self.codec_options
+        for document in self.find(_filter, **options):
+            if encoded is not None:
+                encoded.append(bson.encode(document, codec_options=codec_options))
+                if len(encoded) > self.cache_max_documents:
+                    encoded = None
+            yield document
+        if encoded is not None:
+            cache.put(key, b''.join(encoded), generation)
+
+    def invalidate_cache(self):
+        """
+        Clears the query cache. Writes made through the collection methods call it; call it after writing to the
+        collection by other means, e.g. the pymongo `update_many` or `delete_many` methods.
+        """
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
     # TODO: Override method to return the created document object
     def insert_one(self, session=None, **kwargs):
         _document = dict(**kwargs)
-        return super().insert_one(document=_document, session=session)
+        try:
+            return super().insert_one(document=_document, session=session)
+        finally:
+            self.invalidate_cache()
+
+    def insert_many(self, documents, batch_size=1000, max_batch_bytes=None, ordered=False, validate=True, session=None,
+                    **kwargs) -> BulkInsertResult:
+        """
+        Loads `documents`, any iterable or generator of dictionaries, into the collection. Each row is validated
+        against the declared fields and the valid rows are sent in batches of at most `batch_size` rows and, when
+        given, `max_batch_bytes` BSON bytes, so only one batch is held in memory at a time.
+
+        Invalid rows, rows rejected by the server and batches that fail are reported in the result and do not stop
+        the load.
+
+        :param documents: Rows to insert
+        :param batch_size: Maximum number of rows per batch
+        :type batch_size: int
+        :param max_batch_bytes: Maximum BSON size of a batch, in bytes
+        :type max_batch_bytes: int
+        :param ordered: Stop each batch at its first write error
+        :type ordered: bool
+        :param validate: Validate the rows against the declared fields
+        :type validate: bool
+        :param session: Optional client session the batches run in
+        :return: The inserted ids and the failures of the load
+        """
+        try:
+            return self.__insert_many(documents, batch_size, max_batch_bytes, ordered, validate, session, **kwargs)
+        finally:
+            self.invalidate_cache()
+
+    def __insert_many(self, documents, batch_size, max_batch_bytes, ordered, validate, session, **kwargs):
+        result = BulkInsertResult()
+        batch, positions, batch_bytes = [], [], 0
+        for position, row in enumerate(documents):
+            if validate:
+                errors = self.validate_document(row)
+                if errors:
+                    result.invalid_rows[position] = errors
+                    continue
+            document = dict(row)
+            if max_batch_bytes:
+                size = len(bson.encode(document))
+                if batch and batch_bytes + size > max_batch_bytes:
+                    self._insert_batch(batch, positions, result, ordered, session, **kwargs)
+                    batch, positions, batch_bytes = [], [], 0
+                batch_bytes += size
+            batch.append(document)
+            positions.append(position)
+            if len(batch) >= batch_size:
+                self._insert_batch(batch, positions, result, ordered, session, **kwargs)
+                batch, positions, batch_bytes = [], [], 0
+        if batch:
+            self._insert_batch(batch, positions, result, ordered, session, **kwargs)
+        return result
+
+    def _insert_batch(self, batch, positions, result, ordered, session, **kwargs):
+        result.batches += 1
+        try:
+            super().insert_many(batch, ordered=ordered, session=session, **kwargs)
+        except BulkWriteError as err:
+            errors = err.details.get('writeErrors', ())
+            failed = {error['index'] for error in errors}
+            # An ordered batch stops at its first error, so later rows were never inserted
+            stop = min(failed) if failed and ordered else len(batch)
+            for error in errors:
+                result.write_errors.append(dict(error, index=positions[error['index']]))
+            result.inserted_ids.extend(document['_id'] for index, document in enumerate(batch[:stop])
+                                       if index not in failed)
+        except PyMongoError as err:
+            result.failed_batches.append((result.batches, positions, err))
+        else:
+            result.inserted_ids.extend(document['_id'] for document in batch)
 
     # TODO: Override method to return the updated document object
     def update_one(self, document: Document, update: dict, **kwargs):
         _update = {'$set': update}
-        return super().update_one({'_id': str(document)}, _update, **kwargs)
+        try:
+            result = super().update_one(self._document_filter(document), _update, **kwargs)
+        finally:
+            self.invalidate_cache()
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            self.__update_loaded(identity_map, document, update)
+        return result
+
+    def __update_loaded(self, identity_map, document, update):
+        """
+        Applies the `$set` of an update written to `document` to the document loaded in the identity map, if any.
+        """
+        loaded = identity_map.get(self, document._id)
+        if loaded is not None:
+            values = {name: value for name, value in update.items() if name in self._schema.positions}
+            loaded._written(values, values)
 
-    def delete_one(self, document: Document, **kwargs):
-        kwargs = self._remove_session(**kwargs)
-        return super().delete_one({'_id': str(document)}, **kwargs)
+    def save(self, document: Document, session=None, **kwargs):
+        """
+        Writes the fields of `document` that changed since it was loaded: changed fields are sent in `$set` and
+        removed fields in `$unset`, so the update is as large as the change, not as the document.
+
+        With `version_field` set on the class, the write only applies if the document still has the version it was
+        loaded with, and increments it.
 
-    def multiple_operation(self, pipeline=()):
+        :param document: A document loaded from the collection
+        :type document: Document
+        :param session: Optional client session
+        :return: The UpdateResult, None if the document did not change
+        :raises ConcurrencyException: The version changed, or the document was deleted, since it was loaded
+        """
+        save = self._save_update(document)
+        if save is None:
+            return None
+        _filter, update, values = save
+        try:
+            result = super().update_one(_filter, update, session=session, **kwargs)
+        finally:
+            self.invalidate_cache()
+        if self.version_field and result.acknowledged and not result.matched_count:
+            raise ConcurrencyException()
+        document._written(values)
+        return result
+
+    def save_many(self, documents, ordered=False, session=None) -> BulkOperationResult:
+        """
+        Writes the changes of several documents, as `save` does, with a single bulk write. Documents that did not
+        change are skipped.
+
+        :raises ConcurrencyException: The version of some documents changed since they were loaded. The documents
+            written are not known, so none of them is marked as written.
+        """
+        saves = [(document, self._save_update(document)) for document in documents]
+        saves = [(document, save) for document, save in saves if save is not None]
+        result = BulkOperationResult(ordered=ordered)
+        if not saves:
+            return result
+        requests = [UpdateOne(_filter, update) for _, (_filter, update, _) in saves]
+        try:
+            details = super().bulk_write(requests, ordered=ordered, session=session).bulk_api_result
+        except BulkWriteError as err:
+            details = err.details
+        finally:
+            self.invalidate_cache()
+        result.add_batch(details, 0, {})
+
+        failed = {error['index'] for error in result.write_errors}
+        # An ordered bulk write stops at its first error, so the requests after it were not attempted
+        attempted = min(failed) + 1 if ordered and failed else len(requests)
+        if self.version_field and result.matched_count + len(failed) < attempted:
+            raise ConcurrencyException(message='Some documents were changed or deleted since they were loaded')
+        for index, (document, (_, _, values)) in enumerate(saves):
+            if index not in failed and (not ordered or not failed or index < min(failed)):
+                document._written(values)
+        return result
+
+    def delete_one(self, document: Document, **kwargs):
+        try:
+            result = super().delete_one(self._document_filter(document), **kwargs)
+        finally:
+            self.invalidate_cache()
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.forget(document)
+        return result
+
+    def multiple_operation(self, pipeline=(), ordered=True, session=None) -> BulkOperationResult:
         """
-        WIP
         This method allows the user to create a multiple operation sequence of queries. The sequence is established
-        by the pipeline. The pipeline should be a tuple of dictionaries where the key is the method (i.e. insert_one)
-        and the value are the parameters of the method.
+        by the pipeline. The pipeline should be a sequence (or any iterable) of dictionaries where the key is the
+        method (i.e. insert_one) and the value are the parameters of the method.
 
         Here is the structure for each valid method:
         1) insert_one
@@ -169,48 +705,108 @@ class BaseCollection(MongoCollection):
         How the pipeline is constructed is entirely up to the user, but the structure of the pipeline methods must
         follow the above guidelines.
 
+        The operations are sent with `bulk_write`, split in batches of the server's maximum write batch size, so a
+        pipeline costs one round trip per batch. An ordered pipeline stops at the first failed operation; an unordered
+        one attempts every operation. A list or tuple pipeline is validated before anything is sent, other iterables
+        are validated batch by batch.
+
+        The pipeline is not atomic: the operations written before a failed one stay written, even with `ordered`. For
+        all or nothing, run it in a transaction and abort it when the result has write errors::
+
+            with mongo.client.start_session() as session, session.start_transaction():
+                result = collection.multiple_operation(pipeline, session=session)
+                if result.write_errors:
+                    session.abort_transaction()
+
         :param pipeline: Sequence of methods to run
         :type pipeline: tuple
+        :param ordered: Run the operations in order and stop at the first error
+        :type ordered: bool
+        :param session: Optional client session the operations run in, e.g. one with an active transaction
+        :return: The inserted ids, counts and write errors of the whole pipeline
         """
-        valid_operations = ('insert_one', 'update_one', 'delete_one')
-        self._validate_pipeline(pipeline, valid_operations)
-        with self.client_session() as session:
-            with session.start_transaction():
-                try:
-                    for operation in pipeline:
-                        method = list(operation.keys())[0]
-                        params = list(operation.values())
-                        if method == 'update_one':
-                            op = getattr(self, method)
-                            op(document=params[0]['doc'], update=params[1]['set'], session=session)
-                        if method == 'insert_one':
-                            op = getattr(self, method)
-                            op(**params[0], session=session)
-                        if method == 'delete_one':
-                            op = getattr(self, method)
-                            op(document=params[0], session=session)
-                except Exception as err:  # If ANY error occurs, stop operation and end transaction
-                    session.abort_transaction()
-                    session.end_session()
-            session.commit_transaction()  # Commit the transaction
-            session.end_session()  # End the session
-        return session.has_ended()  # Return if the session has ended
-
-    def _validate_pipeline(self, pipeline: tuple, operations=()):
-        for method in pipeline:
-            if not isinstance(method, dict):
-                raise ValueError('Pipeline must be a list of dictionaries')
-            if method.keys() not in operations:
-                raise ValueError(f'Only the following are valid operations: {operations}')
-            if not isinstance(method.values(), dict):
-                raise ValueError('Method values must be dictionary')
+        requests = self._pipeline_requests(pipeline)
+        if isinstance(pipeline, (list, tuple)):
+            requests = iter(list(requests))
+        try:
+            return self.__bulk_write(requests, ordered, session)
+        finally:
+            self.invalidate_cache()
+
+    def __bulk_write(self, requests, ordered, session):
+        result = BulkOperationResult(ordered=ordered)
+        identity_map = get_identity_map()
+        batch_size = self.max_write_batch_size
+        offset = 0
+        while True:
+            batch = list(islice(requests, batch_size))
+            if not batch:
+                break
+            inserts = {position: document for position, (_, document, _) in enumerate(batch) if document is not None}
+            try:
+                details = super().bulk_write([request for request, _, _ in batch], ordered=ordered,
+                                             session=session).bulk_api_result
+            except BulkWriteError as err:
+                details = err.details
+            result.add_batch(details, offset, inserts)
+            if identity_map is not None:
+                self.__apply_to_identity_map(identity_map, batch, details, ordered)
+            offset += len(batch)
+            if ordered and result.write_errors:
+                break
+        return result
+
+    def __apply_to_identity_map(self, identity_map, batch, details, ordered):
+        """
+        Applies the updates of a batch to the documents loaded in the identity map and drops the deleted documents,
+        as `update_one` and `delete_one` do. Failed operations, and those an ordered batch did not reach, are skipped.
+        """
+        failed = {error['index'] for error in details.get('writeErrors', ())}
+        stop = min(failed) if failed and ordered else len(batch)
+        for position, (_, _, (method, params)) in enumerate(batch[:stop]):
+            if position in failed:
+                continue
             if method == 'update_one':
-                if not isinstance(method['update_one'], dict):
-                    raise ValueError('update_one method must be a dictionary with filter and update data')
-                if not isinstance(method['update_one'].get('filter'), Document):
-                    raise ValueError('Filter must be of type Document')
-                if not isinstance(method['update_one'].get('set'), dict):
+                self.__update_loaded(identity_map, params['doc'], params['set'])
+            elif method == 'delete_one':
+                identity_map.forget(params)
+
+    @property
+    def max_write_batch_size(self) -> int:
+        """
+        Maximum number of write operations the server accepts in one batch. It is asked to the server once.
+        """
+        if self.__max_write_batch_size is None:
+            hello = self.database.command('hello')
+            self.__max_write_batch_size = hello.get('maxWriteBatchSize', DEFAULT_MAX_WRITE_BATCH_SIZE)
+        return self.__max_write_batch_size
+
+    def _pipeline_requests(self, pipeline):
+        """
+        Validates the pipeline operations and yields the bulk write request of each one, along with the document it
+        inserts, if any, and its (method, params).
+        """
+        for index, operation in enumerate(pipeline):
+            if not isinstance(operation, dict) or len(operation) != 1:
+                raise ValueError(f'Pipeline operation {index} must be a dictionary with a single method')
+            (method, params), = operation.items()
+            if method == 'insert_one':
+                if not isinstance(params, dict):
+                    raise ValueError('insert_one value must be a dictionary with the document fields')
+                document = dict(params)
+                yield InsertOne(document), document, (method, params)
+            elif method == 'update_one':
+                if not isinstance(params, dict) or not isinstance(params.get('doc'), Document):
+                    raise ValueError('update_one value must be a dictionary with the Document to update in "doc"')
+                if not isinstance(params.get('set'), dict):
                     raise ValueError('update_one set value must be of type dictionary')
+                yield UpdateOne(self._document_filter(params['doc']), {'$set': params['set']}), None, (method, params)
+            elif method == 'delete_one':
+                if not isinstance(params, Document):
+                    raise ValueError('delete_one value must be a Document')
+                yield DeleteOne(self._document_filter(params)), None, (method, params)
+            else:
+                raise ValueError(f'Only the following are valid operations: {PIPELINE_OPERATIONS}')
 
 
 class CollectionModel(BaseCollection):
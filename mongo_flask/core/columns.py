@@ -0,0 +1,131 @@
+"""
+Columnar export of query results: the values of each field are read from the server documents straight into one
+column per field, without building a Document per row, and converted to NumPy arrays or an Arrow table with the
+column type of the declared fields.
+"""
+from datetime import datetime
+
+from bson import ObjectId
+
+from .batch import numpy
+from ..errors import FieldException
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional, it is only needed by to_arrow
+    pyarrow = None
+
+# Python type of the values of each column type; only columns whose values are all of it, or None, are cast
+COLUMN_VALUE_TYPES = {'int64': int, 'datetime64[ms]': datetime, 'string': str}
+
+
+def column_fields(collection, names) -> list:
+    """
+    Returns the BaseField declared for each name, None for `_id`.
+
+    :raises FieldException: When a name is not `_id` or a field declared in the collection
+    """
+    schema = collection._schema
+    fields = []
+    for name in names:
+        if name == '_id':
+            fields.append(None)
+            continue
+        position = schema.positions.get(name)
+        if position is None:
+            raise FieldException(message=f'{name} is not a field of {collection.__class__.__name__}')
+        fields.append(schema.fields[position])
+    return fields
+
+
+def read_columns(documents, names) -> dict:
+    """
+    Reads the values of `names` from each document into a list per name. Missing values are None.
+    """
+    columns = {name: [] for name in names}
+    appends = [(columns[name].append, name) for name in names]
+    for document in documents:
+        get = document.get
+        for append, name in appends:
+            append(get(name))
+    return columns
+
+
+def numpy_columns(documents, names, fields) -> dict:
+    """
+    Reads the columns of `names` and converts each one to a NumPy array with `numpy_column`.
+    """
+    if numpy is None:
+        raise ImportError('to_numpy needs NumPy, install mongo_flask[numpy]')
+    columns = read_columns(documents, names)
+    return {name: numpy_column(field, columns[name]) for name, field in zip(names, fields)}
+
+
+def arrow_table(documents, names, fields):
+    """
+    Reads the columns of `names` into a pyarrow.Table, converting each one with `arrow_column`.
+    """
+    if pyarrow is None:
+        raise ImportError('to_arrow needs pyarrow, install mongo_flask[arrow]')
+    columns = read_columns(documents, names)
+    return pyarrow.table({name: arrow_column(field, columns[name]) for name, field in zip(names, fields)})
+
+
+def holds_column_type(dtype, values) -> bool:
+    """
+    Whether every value of `values` is None or of the Python type of the column type `dtype`, so that casting the
+    column does not convert any value. Booleans are not integers here.
+    """
+    value_type = COLUMN_VALUE_TYPES.get(dtype)
+    if value_type is None:
+        return False
+    for kind in set(map(type, values)):
+        if kind is not type(None) and (not issubclass(kind, value_type) or issubclass(kind, bool)):
+            return False
+    return True
+
+
+def numpy_column(field, values):
+    """
+    Converts a column to a NumPy array of the column type of `field`. Missing values of an integer column are masked,
+    in a numpy.ma.MaskedArray, and missing dates are NaT. Strings, untyped fields and columns with values of other
+    types, e.g. a float or a string in an integer column, are object arrays holding the values unchanged.
+    """
+    dtype = getattr(field, 'column_type', None)
+    if dtype is not None and dtype != 'string' and holds_column_type(dtype, values):
+        try:
+            if dtype == 'int64':
+                missing = [value is None for value in values]
+                if any(missing):
+                    data = numpy.array([0 if value is None else value for value in values], dtype)
+                    return numpy.ma.masked_array(data, missing)
+            return numpy.array(values, dtype)
+        except OverflowError:  # Integers beyond int64
+            pass
+    column = numpy.empty(len(values), object)
+    column[:] = values
+    return column
+
+
+def arrow_column(field, values):
+    """
+    Converts a column to an Arrow array of the column type of `field`, with nulls for the missing values. The types
+    of untyped fields, and of columns with values of other types than the one of their field, are inferred; ObjectIds,
+    which Arrow does not know, are converted to strings. Columns Arrow cannot infer one type for, e.g. numbers mixed
+    with strings, are converted to strings.
+    """
+    dtype = getattr(field, 'column_type', None)
+    if holds_column_type(dtype, values):
+        try:
+            if dtype == 'int64':
+                return pyarrow.array(values, pyarrow.int64())
+            if dtype == 'datetime64[ms]':
+                return pyarrow.array(values, pyarrow.timestamp('ms'))
+            return pyarrow.array(values, pyarrow.string())
+        except (OverflowError, pyarrow.ArrowInvalid):  # Integers beyond int64
+            pass
+    values = [str(value) if isinstance(value, ObjectId) else value for value in values]
+    try:
+        return pyarrow.array(values)
+    except (OverflowError, pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+        return pyarrow.array([None if value is None else str(value) for value in values], pyarrow.string())
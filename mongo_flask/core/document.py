@@ -1,16 +1,57 @@
-from bson import ObjectId
+import copy
+import functools
+from datetime import datetime
+
+import bson
+from pymongo import ASCENDING, DESCENDING
+
+from .columns import arrow_table, column_fields, numpy_columns, read_columns
+from .rawbson import decode_element, elements
+
+# A RawDocument decodes the rest of the document at once, which is faster than finding more single fields, when a
+# field declared after SCAN_BUDGET is read, after it scanned SCAN_BUDGET elements or after it decoded LOAD_BUDGET fields
+SCAN_BUDGET = 16
+LOAD_BUDGET = 4
+MUTABLE_TYPES = (list, dict)  # Values that can change in place, arrays and embedded documents
+# Types of the BSON values that cannot change in place, checked before looking for mutable values
+IMMUTABLE_TYPES = frozenset({str, int, float, bool, type(None), datetime, bson.ObjectId, bson.Int64, bson.Decimal128,
+                             bytes, bson.Binary})
+
+
+def snapshot(value):
+    """
+    Returns a copy of `value` that in-place changes of `value` do not reach: lists and embedded documents are deep
+    copied, the other BSON values are immutable and returned as they are.
+    """
+    if isinstance(value, MUTABLE_TYPES):
+        return copy.deepcopy(value)
+    return value
 
 
 class Document(dict):
-    def __init__(self, _collection, *, initial: dict = None, data: dict = None, **kwargs):
+    """
+    A document of a collection. The document maps each declared field name to its own value, while the field
+    metadata (the BaseField objects and their validators) is looked up from the schema of the collection class.
+
+    Every collection class gets a generated Document subclass, available as `document_class`, which carries that
+    schema. Documents use `__slots__`, so the only per-document objects are the document and its values.
+    """
+    __slots__ = ('__collection', '__id', '__marked', 'initial', 'data')
+    _schema = None  # Set on the document class generated for each collection
+
+    def __init__(self, _collection, *args, _id=None, initial: dict = None, data: dict = None, **kwargs):
         self.__collection = _collection
-        self.__id = ObjectId()
-        self.initial = initial
+        self.__id = _id  # The _id of the document in the server, None if it was not retrieved from the server
+        self.__marked = None  # Fields marked as changed
+        self.initial = initial  # The document as read from the server, used to find the changed fields
         self.data = data
-        super().__init__(**kwargs)
+        super().__init__(*args, **kwargs)
 
     @property
     def _id(self):
+        """
+        The `_id` of the document as stored in the server.
+        """
         return self.__id
 
     @property
@@ -18,30 +59,576 @@ class Document(dict):
         raise AttributeError('This attribute is read only')
 
     @property
-    def cleaned_data(self):
-        _cleaned = {}
-        for key, field in self.initial:
-            _cleaned[key] = field.data
-        return _cleaned
+    def fields(self) -> dict:
+        """
+        Map of the declared field names to their BaseField objects.
+        """
+        if self._schema is None:
+            return {}
+        return dict(self._schema.items())
+
+    def field(self, name):
+        """
+        Returns the BaseField object declared for `name` in the collection class.
+
+        :param name: Name of the field
+        :type name: str
+        """
+        try:
+            return self._schema.fields[self._schema.positions[name]]
+        except (AttributeError, KeyError):
+            raise KeyError(name) from None
+
+    @property
+    def cleaned_data(self) -> dict:
+        """
+        The values of the declared fields.
+        """
+        if self._schema is None:
+            return dict(self)
+        return {name: self.get(name) for name in self._schema.names}
 
     def __str__(self):
         return str(self._id)
 
-    def changed_data(self):
+    ##########
+    # Change tracking
+    ##########
+    def mark_changed(self, name):
         """
-        Returns a dictionary of the fields that changed. This is to be used for an update of the collection document.
+        Marks a field as changed, so `save` writes it even if it is equal to the value it was loaded with.
         """
+        if self.__marked is None:
+            self.__marked = set()
+        self.__marked.add(name)
+
+    @property
+    def has_changed(self) -> bool:
+        return bool(self.changed_data() or self.removed_fields())
+
+    def changed_data(self) -> dict:
+        """
+        Returns a dictionary of the fields that changed since the document was loaded or saved, with their new
+        values. Values are compared with `initial`, the document as it was read from the server; the document holds
+        copies of its lists and embedded documents, so changes made inside them are found too. This is the `$set` of
+        the update of the collection document.
+        """
+        marked = self.__marked or ()
         changed_data = {}
-        if not self.data:
-            raise ValueError('You must provide new data')
-        for key, value in self.data:
-            if key not in self.initial.keys():
-                raise AttributeError(f'{self.__class__} does not have attr of name {key}')
-            if value != self.cleaned_data[key]:
-                changed_data[key] = value
+        for name, value in self._tracked_items(marked):
+            if name in marked or value != self.original(name):
+                changed_data[name] = value
         return changed_data
 
+    def original(self, name):
+        """
+        Returns the value `name` had when the document was loaded or last saved.
+        """
+        return (self.initial or {}).get(name)
+
+    def removed_fields(self) -> list:
+        """
+        Returns the names of the fields removed from the document since it was loaded or saved. This is the `$unset`
+        of the update of the collection document.
+        """
+        names = self._schema.names if self._schema is not None else (self.initial or {}).keys()
+        return [name for name in names if name not in self and self.original(name) is not None]
+
+    def save(self, **kwargs):
+        """
+        Writes the changed and removed fields of the document, see the `save` method of the collection.
+        """
+        return self.__collection.save(self, **kwargs)
+
+    def _written(self, values=None, fields=None):
+        """
+        Records that `fields`, or every field when None, were written to the server, after applying `values` (e.g. a
+        new version).
+        """
+        if values:
+            self.update(values)
+        self._snapshot(fields)
+        if fields is None:
+            self.__marked = None
+        elif self.__marked:
+            self.__marked.difference_update(fields)
+
+    def _tracked_items(self, marked):
+        """
+        The (name, value) pairs that may have changed, `marked` being the names marked as changed.
+        """
+        return self.items()
+
+    def _snapshot(self, fields=None):
+        """
+        Takes the current values of `fields`, or of every field when None, as the values stored in the server.
+        """
+        initial = dict(self.initial or {})
+        for name in (self.keys() if fields is None else fields):
+            initial[name] = snapshot(self.get(name))
+        for name in (self.removed_fields() if fields is None else ()):
+            initial.pop(name, None)
+        self.initial = initial
+
+
+class RawDocument(Document):
+    """
+    A Document built from the raw BSON of a RawBSONDocument, for collections with `raw_documents` set. The values are
+    decoded the first time they are read, one field at a time, and stored in the document, so reading a few fields of
+    a large document does not decode the others. Fields are found by scanning the elements of the raw BSON, up to the
+    limits of SCAN_BUDGET and LOAD_BUDGET, past which the remaining fields are decoded at once.
+
+    Operations on the whole document, e.g. iterating it, `len`, `items`, comparing it or serializing it to JSON,
+    decode every field first. Changes are tracked by keeping the original value of each field that is set or
+    deleted in `initial`, along with a copy of each list and embedded document when it is decoded, so changes made
+    inside them are found too.
+    """
+    __slots__ = ('__raw', '__options', '__position', '__scanned', '__loads', '__spans', '__removed')
+
+    def __init__(self, _collection, *args, raw=None, codec_options=bson.DEFAULT_CODEC_OPTIONS, **kwargs):
+        super().__init__(_collection, *args, **kwargs)
+        self.__raw = raw  # None once every field is decoded
+        self.__options = codec_options
+        self.__position = 4  # Start of the first element not scanned yet
+        self.__scanned = 0
+        self.__loads = 0
+        self.__spans = None  # Scanned elements of declared fields not decoded yet, name to (start, end)
+        self.__removed = None  # Declared fields deleted from the document
+        for name, value in dict.items(self):
+            self.__keep(name, value)
+
+    @classmethod
+    def from_raw(cls, collection, raw, codec_options=bson.DEFAULT_CODEC_OPTIONS):
+        """
+        Builds the document of `raw`, a BSON document, decoding only its `_id`.
+        """
+        for name, start, end in elements(raw):
+            if name == '_id':
+                if raw[start] == 0x07:
+                    _id = bson.ObjectId(raw[end - 12:end])
+                else:
+                    _id = decode_element(raw, start, end, codec_options)
+                document = cls(collection, _id=_id, raw=raw, codec_options=codec_options)
+                if start == 4:  # The server stores the _id first
+                    document.__position = end
+                return document
+        return cls(collection, raw=raw, codec_options=codec_options)
+
+    @property
+    def decoded(self) -> bool:
+        """
+        Whether every field of the document is decoded.
+        """
+        return self.__raw is None
+
+    def inflate(self):
+        """
+        Decodes the fields that were not read yet. Fields are kept in the order they are declared in.
+        """
+        raw = self.__raw
+        if raw is None:
+            return
+        names = self._schema.names
+        values = bson.decode(raw, self.__options)
+        current = dict(dict.items(self))  # Fields already read or set keep their value
+        dict.clear(self)
+        dict.update(self, zip(names, map(values.get, names)))
+        dict.update(self, current)
+        if not IMMUTABLE_TYPES.issuperset(map(type, values.values())):
+            for name in names:
+                if name not in current:
+                    self.__keep(name, values.get(name))
+        for name in self.__removed or ():
+            dict.pop(self, name, None)
+        self.__raw = self.__spans = None
+
+    def __pending(self, name):
+        return self.__raw is not None and name in self._schema.positions and not dict.__contains__(self, name) \
+            and name not in (self.__removed or ())
+
+    def __load(self, name):
+        """
+        Decodes the pending field `name` and stores it in the document.
+        """
+        self.__loads += 1
+        if self.__loads > LOAD_BUDGET or self.__scanned >= SCAN_BUDGET or \
+                self._schema.positions[name] >= SCAN_BUDGET:
+            self.inflate()
+            return dict.__getitem__(self, name)
+        spans = self.__spans
+        span = spans.pop(name, None) if spans else None
+        if span is None and self.__position is not None:
+            raw, positions = self.__raw, self._schema.positions
+            for element, start, end in elements(raw, self.__position):
+                self.__position = end
+                self.__scanned += 1
+                if element == name:
+                    span = start, end
+                    break
+                if element in positions and not dict.__contains__(self, element):
+                    if self.__spans is None:
+                        self.__spans = {}
+                    self.__spans[element] = start, end
+                if self.__scanned >= SCAN_BUDGET:
+                    self.inflate()
+                    return dict.__getitem__(self, name)
+            else:
+                self.__position = None  # Every element was scanned
+        value = None if span is None else decode_element(self.__raw, *span, self.__options)
+        dict.__setitem__(self, name, value)
+        self.__keep(name, value)
+        return value
+
+    def __keep(self, name, value):
+        # Keeps a copy of a decoded list or embedded document, the only values that can change without being set
+        if isinstance(value, MUTABLE_TYPES):
+            if self.initial is None:
+                self.initial = {}
+            self.initial.setdefault(name, snapshot(value))
+
+    def __remember(self, name):
+        # Keeps the value the field had in the server before its first change
+        if self.initial is None:
+            self.initial = {}
+        if name not in self.initial:
+            self.initial[name] = self.get(name)
+
+    ##########
+    # Mapping
+    ##########
+    def __missing__(self, name):
+        if self.__pending(name):
+            return self.__load(name)
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or self.__pending(name)
+
+    def __bool__(self):
+        return dict.__len__(self) > 0 or any(self.__pending(name) for name in self._schema.names)
+
+    def __setitem__(self, name, value):
+        self.__remember(name)
+        if self.__removed:
+            self.__removed.discard(name)
+        dict.__setitem__(self, name, value)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.__remember(name)
+        dict.pop(self, name)
+        if name in self._schema.positions:
+            if self.__removed is None:
+                self.__removed = set()
+            self.__removed.add(name)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def get(self, name, default=None):
+        if dict.__contains__(self, name):
+            return dict.__getitem__(self, name)
+        if self.__pending(name):
+            return self.__load(name)
+        return default
+
+    def update(self, *args, **kwargs):
+        for name, value in dict(*args, **kwargs).items():
+            self[name] = value
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def pop(self, name, *default):
+        if name not in self:
+            if default:
+                return default[0]
+            raise KeyError(name)
+        value = self[name]
+        del self[name]
+        return value
+
+    def popitem(self):
+        self.inflate()
+        if not dict.__len__(self):
+            raise KeyError('popitem(): dictionary is empty')
+        name = next(reversed(dict.keys(self)))
+        return name, self.pop(name)
+
+    def clear(self):
+        for name in list(self):
+            del self[name]
+
+    @property
+    def cleaned_data(self) -> dict:
+        self.inflate()
+        return super().cleaned_data
+
+    ##########
+    # Change tracking
+    ##########
+    def original(self, name):
+        initial = self.initial or {}
+        return initial[name] if name in initial else self.get(name)
+
+    def _tracked_items(self, marked):
+        # Only the fields that were set, deleted or marked can differ from the server
+        initial = self.initial or {}
+        return [(name, self[name]) for name in {**initial, **dict.fromkeys(marked)} if name in self]
+
+    def _snapshot(self, fields=None):
+        removed = self.__removed or ()
+        initial = dict(self.initial or {})
+        for name in (list(initial) if fields is None else fields):
+            if name in removed:
+                initial[name] = None  # No longer in the server
+            elif isinstance(dict.get(self, name), MUTABLE_TYPES):
+                initial[name] = snapshot(dict.get(self, name))
+            else:
+                initial.pop(name, None)  # The current value is the one in the server
+        self.initial = initial
+
+
+def _inflating(method):
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        self.inflate()
+        for arg in args:
+            if isinstance(arg, RawDocument):
+                arg.inflate()
+        return method(self, *args)
+    return wrapper
+
+
+for _name in ('__iter__', '__len__', '__reversed__', '__eq__', '__ne__', '__or__', '__ror__', '__repr__', 'keys',
+              'items', 'values', 'copy'):
+    setattr(RawDocument, _name, _inflating(getattr(dict, _name)))
+del _name
+
 
 class DocumentSet(list):
     def __str__(self):
         return str([str(doc) for doc in self])
+
+
+class DocumentQuery:
+    """
+    Query options shared by the lazy document sets: the filter plus the projection, sort, skip, limit and batch size
+    sent to the server. `order_by`, `skip`, `limit`, `only` and `batch_size` return a new query, so a query can be
+    refined without changing the original.
+    """
+    def _init_query(self, collection, _filter=None, projection=None, sort=None, skip=0, limit=0, batch_size=0):
+        self._collection = collection
+        self._filter = _filter or {}
+        self._projection = projection
+        self._sort = sort
+        self._skip = skip
+        self._limit = limit
+        self._batch_size = batch_size
+
+    def order_by(self, *keys):
+        """
+        Sorts the documents on the server. Each key is a field name, prefixed with `-` for descending order, or a
+        `(field, direction)` pair as accepted by pymongo.
+        """
+        sort = []
+        for key in keys:
+            if isinstance(key, str):
+                name, direction = (key[1:], DESCENDING) if key.startswith('-') else (key, ASCENDING)
+            else:
+                name, direction = key
+            self._collection.validate_field_name(name)
+            sort.append((name, direction))
+        return self._clone(sort=sort or None)
+
+    def skip(self, skip):
+        """
+        Skips the first `skip` documents of the result on the server.
+        """
+        return self._clone(skip=int(skip))
+
+    def limit(self, limit):
+        """
+        Returns at most `limit` documents. The limit is applied by the server.
+        """
+        return self._clone(limit=int(limit))
+
+    def only(self, *fields):
+        """
+        Restricts the projection to the given fields. By default the projection contains every field declared in the
+        collection.
+        """
+        for name in fields:
+            self._collection.validate_field_name(name)
+        return self._clone(projection={name: 1 for name in fields})
+
+    def batch_size(self, size):
+        """
+        Sets the number of documents the server returns per batch while the set is being iterated.
+
+        :param size: Number of documents per batch
+        :type size: int
+        """
+        return self._clone(batch_size=int(size))
+
+    def _options(self, **changes):
+        options = dict(projection=self._projection, sort=self._sort, skip=self._skip, limit=self._limit,
+                       batch_size=self._batch_size)
+        options.update(changes)
+        return options
+
+    def _clone(self, **changes):
+        return self.__class__(self._collection, self._filter, **self._options(**changes))
+
+    def _find_options(self, **changes):
+        """
+        Keyword arguments of the find command, with the projection of the declared fields by default.
+        """
+        options = self._options(**changes)
+        if options['projection'] is None:
+            options['projection'] = self._collection.projection
+        return options
+
+
+class LazyDocumentSet(DocumentQuery, DocumentSet):
+    """
+    A DocumentSet backed by a live cursor. Documents are built from the cursor batches as the set is iterated, so
+    streaming through a large result keeps memory use flat. Calling `len()`, indexing, `list()` or any of the list
+    methods materializes the result into the set, after which it behaves like a regular DocumentSet.
+
+    The set is also a chainable query: `order_by`, `skip`, `limit`, `only` and slicing return a new set whose options
+    are sent to the server with the find command, so documents that would be thrown away never leave the server.
+    """
+    def __init__(self, collection, _filter=None, *, projection=None, sort=None, skip=0, limit=0, batch_size=0):
+        super().__init__()
+        self._init_query(collection, _filter, projection, sort, skip, limit, batch_size)
+        self._materialized = False
+
+    def __iter__(self):
+        if self._materialized:
+            return super().__iter__()
+        return self._iterate()
+
+    def __bool__(self):
+        if self._materialized:
+            return super().__len__() > 0
+        # Peek at a single document instead of pulling the whole result
+        return next(iter(self._cursor(limit=1)), None) is not None
+
+    def __getitem__(self, item):
+        if self._materialized:
+            return super().__getitem__(item)
+        if isinstance(item, slice):
+            return self._slice(item)
+        if isinstance(item, int) and item >= 0:
+            # Fetch the single document at that position
+            try:
+                return next(iter(self._slice(slice(item, item + 1))))
+            except StopIteration:
+                raise IndexError('DocumentSet index out of range') from None
+        self._materialize()
+        return super().__getitem__(item)
+
+    def __repr__(self):
+        if self._materialized:
+            return super().__repr__()
+        return f'<{self.__class__.__name__} (not evaluated)>'
+
+    @property
+    def materialized(self):
+        return self._materialized
+
+    ##########
+    # Columnar export
+    ##########
+    def to_columns(self, *fields) -> dict:
+        """
+        Reads the result into a list of values per field. The values are read from the server documents, without
+        building a Document per row, and only the exported fields are projected.
+
+        :param fields: Names of the declared fields, or `_id`, to export. All the declared fields by default
+        :return: Map of field name to its column of values, None for the missing values
+        """
+        names = fields or self._collection._schema.names
+        column_fields(self._collection, names)
+        return read_columns(self._column_documents(names), names)
+
+    def to_numpy(self, *fields) -> dict:
+        """
+        Same as `to_columns`, with each column converted to a NumPy array of the column type of its field, e.g.
+        int64 for IntegerField and datetime64 for DateField. Needs NumPy.
+
+        :return: Map of field name to its NumPy array
+        """
+        names = fields or self._collection._schema.names
+        return numpy_columns(self._column_documents(names), names, column_fields(self._collection, names))
+
+    def to_arrow(self, *fields):
+        """
+        Same as `to_columns`, as a pyarrow.Table whose columns have the column type of their field. Needs pyarrow.
+        """
+        names = fields or self._collection._schema.names
+        return arrow_table(self._column_documents(names), names, column_fields(self._collection, names))
+
+    def _column_documents(self, names):
+        if self._materialized:
+            return super().__iter__()
+        return self._cursor(projection=dict.fromkeys(names, 1))
+
+    def _slice(self, item):
+        start, stop = item.start or 0, item.stop
+        if item.step is not None or start < 0 or (stop is not None and stop < 0):
+            self._materialize()
+            return super().__getitem__(item)
+        if stop is not None and stop <= start:
+            return DocumentSet()
+        # The slice is relative to the current skip/limit window
+        limit = self._limit - start if self._limit else 0
+        if stop is not None:
+            limit = min(limit, stop - start) if limit else stop - start
+        if self._limit and limit <= 0:
+            return DocumentSet()
+        return self._clone(skip=self._skip + start, limit=limit)
+
+    def _cursor(self, **changes):
+        return self._collection._find_documents(self._filter, **self._find_options(**changes))
+
+    def _iterate(self):
+        # list() asks for the length, which materializes the set, after it has created the iterator
+        if self._materialized:
+            yield from super().__iter__()
+        else:
+            yield from self._stream()
+
+    def _stream(self, register=False):
+        # Streaming returns the documents already in the identity map but does not add new ones, so it keeps memory
+        # flat; materializing adds the complete documents to the map
+        collection = self._collection
+        projection = self._projection
+        partial = projection is not None and not projection.keys() >= collection._schema.positions.keys()
+        documents = map(collection._set_document_fields, self._cursor())
+        return collection._identity_documents(documents, register and not partial)
+
+    def _materialize(self):
+        if not self._materialized:
+            super().extend(self._stream(register=True))
+            self._materialized = True
+
+
+def _materializing(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._materialize()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+for _name in ('__len__', '__setitem__', '__delitem__', '__contains__', '__reversed__', '__eq__',
+              '__ne__', '__lt__', '__le__', '__gt__', '__ge__', '__add__', '__iadd__', '__mul__', '__imul__',
+              'append', 'extend', 'insert', 'pop', 'remove', 'clear', 'index', 'count', 'copy', 'sort', 'reverse'):
+    setattr(LazyDocumentSet, _name, _materializing(getattr(list, _name)))
+del _name
@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from .validators import validate_int, validate_str
+from .batch import BatchValidation, is_array, numpy, python_value
+from .validators import validate_datetime, validate_int, validate_range, validate_str
 from ..errors import ValidatorsException, ValidationError
 
 
@@ -17,9 +18,24 @@ class ErrorDetail:
 
 
 class BaseField:
-    def __init__(self, *, data=None, required=False, validators=()):
+    batch_types = None  # Types accepted by the batch type check, None skips it
+    array_kinds = ''  # Kinds of the NumPy arrays whose values all have a valid type
+    column_type = None  # Type of the column of the field in columnar exports, None keeps the values as objects
+    min_value = None
+    max_value = None
+
+    def __init__(self, *, data=None, required=False, validators=(), index=False, unique=False):
+        """
+        :param index: Declare a single field index: True for an ascending index, or the index direction or type
+            (e.g. pymongo.DESCENDING, pymongo.HASHED)
+        :param unique: Declare a unique single field index
+        :type unique: bool
+        """
         self.required = required
         self.validators = list(validators)
+        self.index = index
+        self.unique = unique
+        self._batch_validators = set()  # Validators whose checks validate_batch runs over the whole column
         self.__data = data
         self.errors = []
 
@@ -40,16 +56,119 @@ class BaseField:
             except ValidationError as err:
                 self.errors.append(ErrorDetail(**err.exception_data))
 
+    def validate(self, value) -> list:
+        """
+        Validates `value` against the field without changing the field data or errors. A missing value is only an
+        error when the field is required.
+
+        :param value: The value to validate
+        :return: List of ErrorDetail, empty if the value is valid
+        """
+        if value is None:
+            if self.required:
+                return [ErrorDetail(message='This field is required', fix='Provide a value for the field')]
+            return []
+        errors = []
+        for validator in self.validators:
+            if not callable(validator):
+                raise ValidatorsException()
+            try:
+                validator(value)
+            except ValidationError as err:
+                errors.append(ErrorDetail(**err.exception_data))
+        return errors
+
+    def validate_batch(self, values) -> BatchValidation:
+        """
+        Validates a column of values, a list (or any sequence) or a NumPy array, with the same result as `validate`
+        on each value. The required, type and range checks of the field run over the whole column, as array
+        operations for NumPy arrays, and only the other validators run value by value. ErrorDetails are only built
+        for the invalid values, and only when they are read.
+
+        Values of NumPy integer, string and datetime arrays are taken as int, str and datetime values.
+
+        :param values: The column of values to validate
+        :return: The error mask of the column
+        """
+        if is_array(values) and values.dtype.kind != 'O' and \
+                (values.dtype.kind in self.array_kinds or self.batch_types is not None):
+            mask = self._array_mask(values)
+        else:
+            mask = self._sequence_mask(values)
+
+        validators = [validator for validator in self.validators if validator not in self._batch_validators]
+        if validators:
+            for position, value in enumerate(values):
+                if mask[position] or value is None:
+                    continue
+                value = python_value(value)
+                for validator in validators:
+                    if not callable(validator):
+                        raise ValidatorsException()
+                    try:
+                        validator(value)
+                    except ValidationError:
+                        mask[position] = 1
+                        break
+        return BatchValidation(self, values, mask)
+
+    def _sequence_mask(self, values) -> bytearray:
+        required, types = self.required, self.batch_types
+        if types is None:
+            mask = bytearray(value is None and required for value in values)
+        else:
+            mask = bytearray(required if value is None else not isinstance(value, types) for value in values)
+
+        low, high = self.min_value, self.max_value
+        if low is not None or high is not None:
+            for position, value in enumerate(values):
+                if mask[position] or value is None:
+                    continue
+                try:
+                    if (low is not None and value < low) or (high is not None and value > high):
+                        mask[position] = 1
+                except TypeError:  # Values of another type are reported by the type check, as in validate_range
+                    continue
+        return mask
+
+    def _array_mask(self, values):
+        if values.dtype.kind not in self.array_kinds:
+            return numpy.ones(len(values), dtype=bool)  # Every value has an invalid type
+        mask = numpy.zeros(len(values), dtype=bool)
+        if values.dtype.kind == 'M' and self.required:
+            mask |= numpy.isnat(values)
+        if self.min_value is not None:
+            mask |= values < self._array_bound(self.min_value)
+        if self.max_value is not None:
+            mask |= values > self._array_bound(self.max_value)
+        return mask
+
+    def _array_bound(self, value):
+        return value
+
+    def _add_range_validator(self, min_value, max_value):
+        self.min_value = min_value
+        self.max_value = max_value
+        if min_value is not None or max_value is not None:
+            validator = validate_range(min_value, max_value)
+            self.validators.append(validator)
+            self._batch_validators.add(validator)
+
     def _get_user_field_validators(self):
         pass
 
 
 class StringField(BaseField):
+    batch_types = str
+    array_kinds = 'U'
+    column_type = 'string'
+
     def __init__(self, *, min_length=1, max_length=128, **kwargs):
         super().__init__(**kwargs)
         self.min_length = min_length
         self.max_length = max_length
         self.validators.append(validate_str)
+        self._batch_validators.add(validate_str)
 
     def validate_length(self):
         if len(self.data) <= self.min_length or len(self.data) >= self.max_length:
@@ -65,16 +184,32 @@ class TextField(StringField):
 
 
 class IntegerField(BaseField):
-    def __init__(self, **kwargs):
-        super().__init__(validators=[validate_int], **kwargs)
+    batch_types = int
+    array_kinds = 'iub'
+    column_type = 'int64'
+
+    def __init__(self, *, min_value=None, max_value=None, **kwargs):
+        super().__init__(**kwargs)
         self.validators.append(validate_int)
+        self._batch_validators.add(validate_int)
+        self._add_range_validator(min_value, max_value)
 
 
 class DateField(BaseField):
-    def __init__(self, *, data=datetime(1901, 1, 1, 0, 0, 0), **kwargs):
+    batch_types = datetime
+    array_kinds = 'M'
+    column_type = 'datetime64[ms]'  # The precision of BSON dates
+
+    def __init__(self, *, data=datetime(1901, 1, 1, 0, 0, 0), min_value=None, max_value=None, **kwargs):
         if not isinstance(data, datetime):
             raise AttributeError('Data must be of type datetime.')
         super().__init__(data=data, **kwargs)
+        self.validators.append(validate_datetime)
+        self._batch_validators.add(validate_datetime)
+        self._add_range_validator(min_value, max_value)
+
+    def _array_bound(self, value):
+        return numpy.datetime64(value)
 
     def to_string(self, fmt: str):
         return self.data.strftime(fmt)
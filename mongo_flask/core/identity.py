@@ -0,0 +1,131 @@
+import threading
+
+from flask import current_app, g, has_app_context
+
+from ..errors import DocumentException, FlushException
+
+IDENTITY_MAP_KEY = '_mongo_identity_map'
+
+
+class IdentityMap:
+    """
+    Documents loaded during one application context, keyed by their collection and `_id`. A document is loaded once
+    per context: `get(_id=...)` is answered from the map and other reads return the document already in the map, so
+    every part of a request sees and changes the same object.
+
+    Documents marked dirty with `mark_dirty` are written by `flush`, with one bulk write per collection.
+    """
+    def __init__(self):
+        self.__documents = {}  # (document class, _id) to document
+        self.__collections = {}  # Document class to its collection
+        self.__dirty = {}  # (document class, _id) to document, in the order they were marked
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__documents)
+
+    def __contains__(self, document):
+        return (type(document), document._id) in self.__documents
+
+    @property
+    def dirty(self) -> list:
+        return list(self.__dirty.values())
+
+    def get(self, collection, _id):
+        """
+        Returns the document of `collection` with `_id`, or None if it was not loaded in this context.
+        """
+        return self.__documents.get((collection.document_class, _id))
+
+    def merge(self, collection, document):
+        """
+        Adds `document` to the map and returns it, or returns the document with the same `_id` already in the map.
+        Documents without an `_id` are returned as they are.
+        """
+        if document._id is None:
+            return document
+        key = (collection.document_class, document._id)
+        with self.__lock:  # Queries of a QueryPool load documents from several threads
+            current = self.__documents.get(key)
+            if current is None:
+                self.__collections[collection.document_class] = collection
+                current = self.__documents[key] = document
+        return current
+
+    def loaded(self, collection, document):
+        """
+        Returns the document with the same `_id` as `document` already in the map, or `document` when there is none.
+        Unlike `merge`, `document` is not added to the map.
+        """
+        current = self.__documents.get((collection.document_class, document._id))
+        return document if current is None else current
+
+    def forget(self, document):
+        key = (type(document), document._id)
+        self.__documents.pop(key, None)
+        self.__dirty.pop(key, None)
+
+    def mark_dirty(self, document):
+        """
+        Marks a document of the map to be written by `flush`.
+        """
+        key = (type(document), document._id)
+        if self.__documents.get(key) is not document:
+            raise DocumentException(message='Only documents of the identity map can be marked dirty',
+                                    fix='Load the document with the collection methods before marking it')
+        self.__dirty[key] = document
+
+    def flush(self) -> list:
+        """
+        Writes the changes of the dirty documents with one `save_many` per collection, so each document only sends
+        its changed and removed fields, and marks them clean.
+
+        :return: The BulkOperationResult of each collection
+        """
+        pending = {}
+        for (document_class, _), document in self.__dirty.items():
+            pending.setdefault(document_class, []).append(document)
+        self.__dirty.clear()
+        return [self.__collections[document_class].save_many(documents) for document_class, documents in
+                pending.items()]
+
+    def clear(self):
+        self.__documents.clear()
+        self.__collections.clear()
+        self.__dirty.clear()
+
+
+def get_identity_map():
+    """
+    Returns the identity map of the current application context, created on first use when MONGO_IDENTITY_MAP is
+    set in the configuration. Returns None outside an application context or when the identity map is disabled.
+    """
+    if not has_app_context():
+        return None
+    identity_map = g.get(IDENTITY_MAP_KEY)
+    if identity_map is None and current_app.config.get('MONGO_IDENTITY_MAP'):
+        identity_map = IdentityMap()
+        setattr(g, IDENTITY_MAP_KEY, identity_map)
+    return identity_map
+
+
+def flush_identity_map(response):
+    """
+    `after_request` hook: flushes the dirty documents of the request when MONGO_IDENTITY_MAP_FLUSH is set. It does
+    not run when the view raised, so the changes of a failed request are not written.
+    """
+    identity_map = g.get(IDENTITY_MAP_KEY)
+    if identity_map is not None and current_app.config.get('MONGO_IDENTITY_MAP_FLUSH'):
+        results = identity_map.flush()
+        if not all(result.success for result in results):
+            raise FlushException(results)
+    return response
+
+
+def drop_identity_map(exception=None):
+    """
+    `teardown_appcontext` hook: drops the identity map of the context.
+    """
+    identity_map = g.pop(IDENTITY_MAP_KEY, None)
+    if identity_map is not None:
+        identity_map.clear()
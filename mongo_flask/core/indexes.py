@@ -0,0 +1,93 @@
+from collections.abc import Mapping
+
+from pymongo import ASCENDING, IndexModel
+
+from ..errors import FieldException
+
+# Index options compared when reconciling a declared index with the index in the server
+INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+class IndexReport:
+    """
+    Result of reconciling the indexes declared in a collection class with the indexes in the server. Indexes are
+    matched by their keys.
+
+    `missing` are the declared indexes (IndexModel) not found in the server, `extra` the names of the server indexes
+    that are not declared and `conflicting` the names of the server indexes whose keys match a declared index but
+    whose options (unique, sparse, TTL or partial filter) differ. Only missing indexes are created; extra and
+    conflicting indexes are reported and left alone.
+    """
+    def __init__(self, collection_name, missing=(), extra=(), conflicting=(), created=(), dry_run=False):
+        self.collection_name = collection_name
+        self.missing = list(missing)
+        self.extra = list(extra)
+        self.conflicting = list(conflicting)
+        self.created = list(created)  # Names of the indexes created, empty in a dry run
+        self.dry_run = dry_run
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.collection_name} missing={self.missing_names} ' \
+               f'extra={self.extra} conflicting={self.conflicting} created={self.created}>'
+
+    @property
+    def missing_names(self) -> list:
+        return [index.document['name'] for index in self.missing]
+
+    @property
+    def in_sync(self) -> bool:
+        return not (self.missing or self.extra or self.conflicting)
+
+
+def declared_indexes(collection_cls) -> tuple:
+    """
+    Compiles the indexes declared in a collection class: the `index` and `unique` options of its fields, followed by
+    the IndexModel objects of its `indexes` attribute. Index keys must be `_id` or declared fields.
+    """
+    indexes = []
+    for name, field in collection_cls._schema.items():
+        if field.index or field.unique:
+            direction = ASCENDING if field.index in (True, False) else field.index
+            options = {'unique': True} if field.unique else {}
+            indexes.append(IndexModel([(name, direction)], **options))
+    for index in collection_cls.indexes:
+        if not isinstance(index, IndexModel):
+            raise TypeError(f'{collection_cls.__name__}.indexes must only hold pymongo.IndexModel objects')
+        for name, _ in _index_key(index.document['key']):
+            if name != '_id' and name.split('.', 1)[0] not in collection_cls._schema.positions:
+                raise FieldException(message=f'Index key {name} is not a field of {collection_cls.__name__}')
+        indexes.append(index)
+    return tuple(indexes)
+
+
+def reconcile_indexes(collection_name, declared, existing: dict, dry_run=False) -> IndexReport:
+    """
+    Compares the declared indexes with `existing`, the result of `index_information()`.
+    """
+    existing_keys = {_index_key(spec['key']): name for name, spec in existing.items()}
+    missing, conflicting, matched = [], [], {'_id_'}
+    for index in declared:
+        document = index.document
+        name = existing_keys.get(_index_key(document['key']))
+        if name is None:
+            missing.append(index)
+            continue
+        matched.add(name)
+        if _index_options(document) != _index_options(existing[name]):
+            conflicting.append(name)
+    extra = [name for name in existing if name not in matched]
+    return IndexReport(collection_name, missing, extra, conflicting, dry_run=dry_run)
+
+
+def _index_key(key) -> tuple:
+    pairs = key.items() if isinstance(key, Mapping) else key
+    return tuple((name, int(direction) if isinstance(direction, float) else direction) for name, direction in pairs)
+
+
+def _index_options(spec) -> dict:
+    options = {option: spec[option] for option in INDEX_OPTIONS if spec.get(option) is not None}
+    if not options.get('unique'):
+        options.pop('unique', None)
+    if not options.get('sparse'):
+        options.pop('sparse', None)
+    return options
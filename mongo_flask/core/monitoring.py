@@ -0,0 +1,141 @@
+import logging
+import threading
+from typing import NamedTuple
+
+import bson
+from flask import current_app, g, has_app_context
+from pymongo.monitoring import CommandListener
+
+QUERY_STATS_KEY = '_mongo_query_stats'
+
+logger = logging.getLogger('mongo_flask')
+
+
+class CommandRecord(NamedTuple):
+    """
+    One command sent to the server, as seen by the QueryMonitor.
+    """
+    command_name: str
+    database_name: str
+    collection: str  # None for commands that do not target a collection
+    duration_ms: float
+    documents: int  # Documents returned by a cursor batch, or affected by a write
+    bytes: int  # BSON size of the reply, None unless the monitor measures bytes
+    succeeded: bool
+
+
+class QueryStats:
+    """
+    Totals of the commands run during one application context (so, one request).
+    """
+    def __init__(self):
+        self.count = 0
+        self.failed = 0
+        self.duration_ms = 0.0
+        self.documents = 0
+        self.bytes = 0
+        self.records = []
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} count={self.count} duration_ms={self.duration_ms:.1f} ' \
+               f'documents={self.documents}>'
+
+    def add(self, record: CommandRecord):
+        with self.__lock:  # Queries of a QueryPool record their commands from several threads
+            self.count += 1
+            self.failed += not record.succeeded
+            self.duration_ms += record.duration_ms
+            self.documents += record.documents
+            self.bytes += record.bytes or 0
+            self.records.append(record)
+
+
+class QueryMonitor(CommandListener):
+    """
+    pymongo command listener that records every command of the clients it is registered on. Each CommandRecord is
+    added to the QueryStats of the current application context, logged to the `mongo_flask` logger when it takes at
+    least `slow_ms` milliseconds, and passed to every sink.
+
+    A sink is any callable that takes a CommandRecord, e.g. the adapter of a metrics exporter. Sinks run on the
+    thread that sent the command, so they should be fast; errors raised by a sink are logged and ignored.
+
+    :param slow_ms: Duration from which a command is logged as slow, None disables the slow query log
+    :param sinks: Callables that receive each CommandRecord
+    :param measure_bytes: Measure the BSON size of each reply. It encodes the reply again, so it is off by default
+    """
+    def __init__(self, slow_ms=None, sinks=(), measure_bytes=False):
+        self.slow_ms = slow_ms
+        self.sinks = list(sinks)
+        self.measure_bytes = measure_bytes
+        self.__collections = {}  # (connection, request id) of the running commands to their collection
+        self.__lock = threading.Lock()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        with self.__lock:
+            self.__collections[(event.connection_id, event.request_id)] = \
+                collection if isinstance(collection, str) else None
+
+    def succeeded(self, event):
+        reply = event.reply
+        cursor = reply.get('cursor')
+        if isinstance(cursor, dict):
+            documents = len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+        else:
+            documents = reply.get('n', 0)
+        size = len(bson.encode(reply)) if self.measure_bytes else None
+        self.__record(event, documents, size, True)
+
+    def failed(self, event):
+        self.__record(event, 0, None, False)
+
+    def __record(self, event, documents, size, succeeded):
+        with self.__lock:
+            collection = self.__collections.pop((event.connection_id, event.request_id), None)
+        record = CommandRecord(event.command_name, event.database_name, collection, event.duration_micros / 1000,
+                               documents, size, succeeded)
+
+        stats = get_query_stats(create=True)
+        if stats is not None:
+            stats.add(record)
+        if self.slow_ms is not None and record.duration_ms >= self.slow_ms:
+            logger.warning('Slow MongoDB command %s on %s.%s took %.1f ms', record.command_name,
+                           record.database_name, record.collection, record.duration_ms)
+        for sink in self.sinks:
+            try:
+                sink(record)
+            except Exception:
+                logger.exception('MongoDB command sink %r failed', sink)
+
+
+def get_query_stats(create=False):
+    """
+    Returns the QueryStats of the current application context, or None outside an application context or when no
+    command was recorded yet and `create` is False.
+    """
+    if not has_app_context():
+        return None
+    stats = g.get(QUERY_STATS_KEY)
+    if stats is None and create:
+        stats = QueryStats()
+        setattr(g, QUERY_STATS_KEY, stats)
+    return stats
+
+
+def add_query_stats_headers(response):
+    """
+    `after_request` hook: adds the number and total duration of the commands of the request to the response, in the
+    X-Mongo-Queries and X-Mongo-Query-Time headers, when MONGO_QUERY_STATS_HEADERS is set.
+    """
+    if current_app.config.get('MONGO_QUERY_STATS_HEADERS'):
+        stats = get_query_stats() or QueryStats()
+        response.headers['X-Mongo-Queries'] = str(stats.count)
+        response.headers['X-Mongo-Query-Time'] = f'{stats.duration_ms:.3f}'
+    return response
@@ -0,0 +1,85 @@
+import base64
+import binascii
+
+import bson
+from bson.errors import BSONError
+from pymongo import ASCENDING, DESCENDING
+
+from .document import DocumentSet
+from ..errors import PaginationException
+
+
+class Page(DocumentSet):
+    """
+    One page of a keyset pagination. `next_token` is the opaque token of the following page, None on the last page.
+    """
+    def __init__(self, documents=(), next_token=None, per_page=None):
+        super().__init__(documents)
+        self.next_token = next_token
+        self.per_page = per_page
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_token is not None
+
+
+def parse_sort_key(order_by):
+    """
+    Splits a sort key, a field name prefixed with `-` for descending order, into the name and the direction.
+    """
+    if order_by.startswith('-'):
+        return order_by[1:], DESCENDING
+    return order_by, ASCENDING
+
+
+def encode_token(name, direction, value, _id) -> str:
+    raw = bson.encode({'k': name, 'd': direction, 'v': value, 'i': _id})
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token, name, direction):
+    """
+    Returns the sort value and `_id` of the last document of the previous page.
+
+    :raises PaginationException: The token is malformed or was made for another sort key
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        position = bson.decode(raw)
+        value, _id = position['v'], position['i']
+    except (TypeError, ValueError, KeyError, binascii.Error, BSONError):
+        raise PaginationException() from None
+    if position.get('k') != name or position.get('d') != direction:
+        raise PaginationException(message=f'Pagination token was not made for the sort key {name}')
+    return value, _id
+
+
+def keyset_filter(name, direction, value, _id) -> dict:
+    """
+    Filter of the documents that come after (`value`, `_id`) in the sort order. `_id` breaks the ties of the sort key,
+    so no document is skipped or repeated when several documents share a value.
+    """
+    after = '$gt' if direction == ASCENDING else '$lt'
+    if name == '_id':
+        return {'_id': {after: _id}}
+    if value is None:
+        # Null sorts before every other value
+        if direction == ASCENDING:
+            return {'$or': [{name: None, '_id': {after: _id}}, {name: {'$ne': None}}]}
+        return {name: None, '_id': {after: _id}}
+    after_value = [{name: {after: value}}, {name: value, '_id': {after: _id}}]
+    if direction == DESCENDING:
+        after_value.append({name: None})
+    return {'$or': after_value}
+
+
+def field_value(document, name):
+    """
+    Value of a field, following dotted paths into embedded documents.
+    """
+    value = document
+    for part in name.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
@@ -0,0 +1,105 @@
+import contextvars
+import threading
+from concurrent.futures import ALL_COMPLETED, FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+
+import pymongo
+
+from .document import LazyDocumentSet
+from .identity import get_identity_map
+from .monitoring import get_query_stats
+
+DEFAULT_POOL_SIZE = 4
+
+
+class QueryPool:
+    """
+    Bounded thread pool that runs independent queries at the same time, e.g. the reads of a dashboard view, so the
+    view waits for the slowest query instead of the sum of all of them. The threads use the connection pool of the
+    client; keep `max_workers` at or below its maxPoolSize, or the queries wait for a connection.
+
+    Each query runs in a copy of the context of the caller, so `current_app`, `g`, the identity map and the query
+    stats are the ones of the calling view. The threads are started on first use.
+
+    :param max_workers: Number of queries that run at the same time
+    :type max_workers: int
+    """
+    def __init__(self, max_workers=DEFAULT_POOL_SIZE):
+        self.max_workers = max_workers
+        self.__executor = None
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} max_workers={self.max_workers}>'
+
+    def submit(self, query, *args, timeout=None, **kwargs) -> Future:
+        """
+        Runs `query(*args, **kwargs)` in the pool. A lazy DocumentSet returned by the query is loaded in the pool,
+        so the caller gets the documents and not a query still to run.
+
+        :param timeout: Seconds the MongoDB operations of the query may take, see `pymongo.timeout`. When the time is
+            up the running operation fails with a timeout error. None sets no limit
+        :type timeout: float
+        :return: A concurrent.futures.Future of the result. `cancel()` drops the query if it did not start yet
+        """
+        with self.__lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='mongo_flask')
+            executor = self.__executor
+        # A context can only be entered by one thread at a time, so each query gets its own copy
+        return executor.submit(contextvars.copy_context().run, _run_query, query, args, kwargs, timeout)
+
+    def gather(self, *queries, timeout=None, return_exceptions=False) -> list:
+        """
+        Runs `queries`, callables without arguments such as `lambda: users.count(active=True)`, in the pool and
+        returns their results in the same order.
+
+        When a query fails, the queries that did not start are cancelled, the running ones are waited for, and the
+        error is raised. With `return_exceptions`, every query runs and the errors are returned in the results.
+
+        :param timeout: Seconds the MongoDB operations of each query may take, see `submit`
+        :type timeout: float
+        :param return_exceptions: Return the errors of the failed queries instead of raising the first one
+        :type return_exceptions: bool
+        :return: The result, or the error, of each query
+        """
+        # Created before the queries start, so that they all use the same ones
+        get_identity_map()
+        get_query_stats(create=True)
+
+        futures = [self.submit(query, timeout=timeout) for query in queries]
+        _, pending = wait(futures, return_when=ALL_COMPLETED if return_exceptions else FIRST_EXCEPTION)
+        if pending:
+            for future in pending:
+                future.cancel()
+            wait(pending)
+        results = []
+        for future in futures:
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results.append(future.result() if error is None else error)
+        return results
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """
+        Stops the threads of the pool. The pool starts new ones if it is used again.
+        """
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def _run_query(query, args, kwargs, timeout):
+    if timeout is None:
+        return _loaded(query(*args, **kwargs))
+    with pymongo.timeout(timeout):
+        return _loaded(query(*args, **kwargs))
+
+
+def _loaded(result):
+    if isinstance(result, LazyDocumentSet):
+        result._materialize()
+    return result
@@ -0,0 +1,74 @@
+"""
+Scanner of the top level elements of a BSON document. It finds where an element is without decoding the elements
+before it, so a single field of a raw document can be decoded on its own.
+"""
+import struct
+
+import bson
+
+_INT32 = struct.Struct('<i')
+
+# Size of the value of the fixed size BSON types
+FIXED_SIZES = {
+    0x01: 8,  # Double
+    0x06: 0,  # Undefined
+    0x07: 12,  # ObjectId
+    0x08: 1,  # Boolean
+    0x09: 8,  # UTC datetime
+    0x0A: 0,  # Null
+    0x10: 4,  # Int32
+    0x11: 8,  # Timestamp
+    0x12: 8,  # Int64
+    0x13: 16,  # Decimal128
+    0x7F: 0,  # Max key
+    0xFF: 0,  # Min key
+}
+# Types whose value starts with its size, plus the bytes the size does not count
+SIZED_TYPES = {
+    0x02: 4,  # String
+    0x0D: 4,  # JavaScript code
+    0x0E: 4,  # Symbol
+    0x03: 0,  # Embedded document
+    0x04: 0,  # Array
+    0x0F: 0,  # JavaScript code with scope
+    0x05: 5,  # Binary, with its subtype byte
+}
+
+
+def elements(raw, position=4):
+    """
+    Yields the name, start and end of each top level element of `raw`, from `position`, which must be the start of
+    an element.
+
+    :param raw: The BSON document
+    :type raw: bytes
+    """
+    last = len(raw) - 1  # The document ends with a null byte
+    while position < last:
+        name_end = raw.index(0, position + 1)
+        value = name_end + 1
+        element_type = raw[position]
+        size = FIXED_SIZES.get(element_type)
+        if size is None:
+            extra = SIZED_TYPES.get(element_type)
+            if extra is not None:
+                size = extra + _INT32.unpack_from(raw, value)[0]
+            elif element_type == 0x0B:  # Regular expression: pattern and options
+                size = raw.index(0, raw.index(0, value) + 1) + 1 - value
+            elif element_type == 0x0C:  # DBPointer: namespace and ObjectId
+                size = 4 + _INT32.unpack_from(raw, value)[0] + 12
+            else:
+                raise bson.InvalidBSON(f'Unknown BSON type {element_type:#x}')
+        end = value + size
+        yield raw[position + 1:name_end].decode('utf-8'), position, end
+        position = end
+
+
+def decode_element(raw, start, end, codec_options=bson.DEFAULT_CODEC_OPTIONS):
+    """
+    Decodes the element between `start` and `end` of `raw`.
+
+    :return: The value of the element
+    """
+    element = bson.decode(_INT32.pack(end - start + 5) + raw[start:end] + b'\x00', codec_options)
+    return next(iter(element.values()))
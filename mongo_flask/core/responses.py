@@ -0,0 +1,77 @@
+import json
+from collections.abc import Mapping
+
+from bson import json_util
+from flask import Response, has_request_context, stream_with_context
+
+from .document import Document, LazyDocumentSet
+
+CHUNK_SIZE = 64 * 1024  # Characters of JSON buffered before a chunk is sent
+
+
+def stream_json(query, ndjson=False, chunk_size=CHUNK_SIZE, json_options=json_util.DEFAULT_JSON_OPTIONS,
+                status=200, headers=None) -> Response:
+    """
+    Returns a response that streams the documents of `query` as a JSON array, or as NDJSON (one document per line).
+    The documents are encoded as they are read from the cursor and sent in chunks of about `chunk_size` characters;
+    the next chunk is only built when the server asks for it, so a slow client holds back the cursor and memory use
+    stays flat whatever the size of the result.
+
+    Values are encoded with the Extended JSON of `bson.json_util`, e.g. ObjectIds as `{"$oid": ...}`. A query that
+    fails after the first chunk was sent can only end the response early, the status code is already sent.
+
+    :param query: A lazy DocumentSet, e.g. `collection.filter(...)`, or any iterable of documents, e.g. an Aggregation
+    :param ndjson: Stream NDJSON (`application/x-ndjson`) instead of a JSON array
+    :type ndjson: bool
+    :param chunk_size: Characters of JSON per chunk
+    :type chunk_size: int
+    :param json_options: The bson.json_util.JSONOptions to encode the BSON types with
+    """
+    chunks = iter_json(query, ndjson, chunk_size, json_options)
+    if has_request_context():
+        chunks = stream_with_context(chunks)
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(chunks, status=status, headers=headers, mimetype=mimetype)
+
+
+def iter_json(query, ndjson=False, chunk_size=CHUNK_SIZE, json_options=json_util.DEFAULT_JSON_OPTIONS):
+    """
+    Yields the JSON of the documents of `query` in chunks, see `stream_json`.
+    """
+    if isinstance(query, LazyDocumentSet) and not query.materialized:
+        documents = query._cursor()  # The server documents, with their _id and without building Documents
+    else:
+        documents = iter(query)
+
+    def default(value):
+        if isinstance(value, Mapping):  # e.g. RawBSONDocument
+            return dict(value)
+        return json_util.default(value, json_options)
+
+    encode = json.JSONEncoder(default=default, separators=(',', ':')).encode
+    parts, size = ([] if ndjson else ['[']), 0
+    separator = '\n' if ndjson else ','
+    try:
+        for position, document in enumerate(documents):
+            if isinstance(document, Document) and document._id is not None:
+                document = {'_id': document._id, **document}
+            text = encode(document)
+            if ndjson:
+                parts += text, separator
+            elif position:
+                parts += separator, text
+            else:
+                parts.append(text)
+            size += len(text)
+            if size >= chunk_size:
+                yield ''.join(parts)
+                parts.clear()
+                size = 0
+    finally:
+        close = getattr(documents, 'close', None)
+        if close is not None:
+            close()  # Also when the client disconnected, so the server cursor is not left open
+    if not ndjson:
+        parts.append(']')
+    if parts:
+        yield ''.join(parts)
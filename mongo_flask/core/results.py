@@ -0,0 +1,76 @@
+class BulkOperationResult:
+    """
+    Result of a bulk write sent by `multiple_operation`. The counts are added up across every batch sent to the
+    server. Write errors keep the `index` of the failed operation in the pipeline.
+    """
+    def __init__(self, ordered=True):
+        self.ordered = ordered
+        self.inserted_ids = []
+        self.upserted_ids = {}
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.write_errors = []
+        self.batches = 0
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} inserted={len(self.inserted_ids)} matched={self.matched_count} ' \
+               f'modified={self.modified_count} deleted={self.deleted_count} errors={len(self.write_errors)}>'
+
+    @property
+    def success(self) -> bool:
+        return not self.write_errors
+
+    def add_batch(self, details: dict, offset: int, inserts: dict):
+        """
+        Adds the raw result of one batch to the totals.
+
+        :param details: The bulk API result document of the batch
+        :type details: dict
+        :param offset: Position in the pipeline of the first operation of the batch
+        :type offset: int
+        :param inserts: Documents inserted by the batch, keyed by their position in the batch
+        :type inserts: dict
+        """
+        self.batches += 1
+        self.matched_count += details.get('nMatched', 0)
+        self.modified_count += details.get('nModified', 0)
+        self.deleted_count += details.get('nRemoved', 0)
+        for upsert in details.get('upserted', ()):
+            self.upserted_ids[offset + upsert['index']] = upsert['_id']
+
+        failed = set()
+        for error in details.get('writeErrors', ()):
+            error = dict(error, index=offset + error['index'])
+            failed.add(error['index'] - offset)
+            self.write_errors.append(error)
+        # An ordered batch stops at its first error, so later operations were never applied
+        stop = min(failed) if failed and self.ordered else None
+        for position, document in inserts.items():
+            if position not in failed and (stop is None or position < stop):
+                self.inserted_ids.append(document['_id'])
+
+
+class BulkInsertResult:
+    """
+    Result of `insert_many`. Rows are identified by their position in the iterable that was loaded. Invalid rows are
+    never sent to the server; write errors and failed batches do not stop the load.
+    """
+    def __init__(self):
+        self.inserted_ids = []
+        self.invalid_rows = {}  # Row position to {field name: [ErrorDetail]}
+        self.write_errors = []  # Server write errors, with the row position in `index`
+        self.failed_batches = []  # (batch number, positions of the rows of the batch, exception)
+        self.batches = 0
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} inserted={self.inserted_count} invalid={len(self.invalid_rows)} ' \
+               f'errors={len(self.write_errors)} failed_batches={len(self.failed_batches)}>'
+
+    @property
+    def inserted_count(self) -> int:
+        return len(self.inserted_ids)
+
+    @property
+    def success(self) -> bool:
+        return not (self.invalid_rows or self.write_errors or self.failed_batches)
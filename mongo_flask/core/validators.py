@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from ..errors import ValidationError
 
 
@@ -23,3 +25,31 @@ def validate_str(value):
             message=f'Value is of type {type(value)} and should be str',
             fix='Use string values'
         )
+
+
+def validate_datetime(value):
+    if not isinstance(value, datetime):
+        raise ValidationError(
+            message=f'Value is of type {type(value)} and should be datetime',
+            fix='Use datetime values'
+        )
+
+
+def validate_range(min_value=None, max_value=None):
+    """
+    Builds a validator that checks `min_value <= value <= max_value`. Either bound may be None.
+    """
+    def validator(value):
+        try:
+            out_of_range = (min_value is not None and value < min_value) or \
+                           (max_value is not None and value > max_value)
+        except TypeError:  # Values of another type are reported by the type validator
+            return
+        if out_of_range:
+            raise ValidationError(
+                message=f'Value {value} is not between {min_value} and {max_value}',
+                fix=f'Use values from {min_value} to {max_value}'
+            )
+    validator.min_value = min_value
+    validator.max_value = max_value
+    return validator
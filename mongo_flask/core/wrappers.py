@@ -1,23 +1,88 @@
+import threading
+import weakref
+from collections import OrderedDict
+
 from pymongo import MongoClient
 from pymongo.database import Database
 from pymongo.collection import Collection
 
+WRAPPER_CACHE_SIZE = 64
+
+
+class WrapperCache:
+    """
+    Cache of the wrapper objects built by attribute or item access, e.g. `client.db.collection`, so repeated access
+    returns the same object instead of building a new one. The most recently used wrappers are kept in a bounded LRU;
+    wrappers evicted from it are still returned while something else holds a reference to them.
+
+    Each parent object has its own cache, so wrappers are keyed by their name and the options of the parent. The
+    cache is shared by the threads that serve requests, so it is locked.
+    """
+    def __init__(self, maxsize=WRAPPER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.__recent = OrderedDict()
+        self.__alive = weakref.WeakValueDictionary()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__alive)
+
+    def get(self, name):
+        with self.__lock:
+            wrapper = self.__recent.get(name)
+            if wrapper is not None:
+                self.__recent.move_to_end(name)
+                return wrapper
+            wrapper = self.__alive.get(name)
+            if wrapper is not None:
+                self.__remember(name, wrapper)
+            return wrapper
+
+    def put(self, name, wrapper):
+        with self.__lock:
+            self.__alive[name] = wrapper
+            self.__remember(name, wrapper)
+        return wrapper
+
+    def clear(self):
+        with self.__lock:
+            self.__recent.clear()
+            self.__alive.clear()
+
+    def __remember(self, name, wrapper):
+        self.__recent[name] = wrapper
+        self.__recent.move_to_end(name)
+        if len(self.__recent) > self.maxsize:
+            self.__recent.popitem(last=False)
+
+
+def wrapper_cache(parent) -> WrapperCache:
+    """
+    Returns the wrapper cache of `parent`, creating it on first use. The instance dictionary is used directly because
+    the wrappers resolve unknown attributes as databases or collections.
+    """
+    try:
+        return parent.__dict__['_wrapper_cache']
+    except KeyError:
+        # setdefault, so threads that get here at the same time share one cache
+        return parent.__dict__.setdefault('_wrapper_cache', WrapperCache())
+
 
 class MongoConnect(MongoClient):
     """
     Wrapper from the pymongo.MongoClient class
     """
     def __getattr__(self, name):
-        attr = super(MongoConnect, self).__getattr__(name)
-        if isinstance(attr, Database):
-            return MongoDatabase(self, name)
-        return attr
-    
+        if name.startswith('_'):
+            return super(MongoConnect, self).__getattr__(name)
+        return self[name]
+
     def __getitem__(self, item):
-        attr = super(MongoConnect, self).__getitem__(item)
-        if isinstance(attr, Database):
-            return MongoDatabase(self, item)
-        return attr
+        cache = wrapper_cache(self)
+        database = cache.get(item)
+        if database is None:
+            database = cache.put(item, MongoDatabase(self, item))
+        return database
 
 
 class MongoDatabase(Database):
@@ -25,16 +90,16 @@ class MongoDatabase(Database):
     Wrapper for the pymongo.database.Database class
     """
     def __getattr__(self, name):  # noqa: D105
-        attr = super(MongoDatabase, self).__getattr__(name)
-        if isinstance(attr, Collection):
-            return MongoCollection(self, name)
-        return attr
+        if name.startswith('_'):
+            return super(MongoDatabase, self).__getattr__(name)
+        return self[name]
 
     def __getitem__(self, item):  # noqa: D105
-        item_ = super(MongoDatabase, self).__getitem__(item)
-        if isinstance(item_, Collection):
-            return MongoCollection(self, item)
-        return item_
+        cache = wrapper_cache(self)
+        collection = cache.get(item)
+        if collection is None:
+            collection = cache.put(item, MongoCollection(self, item))
+        return collection
 
 
 class MongoCollection(Collection):
@@ -42,15 +107,16 @@ class MongoCollection(Collection):
     Wrapper class for the pymongo.collection.Collection class
     """
     def __getattr__(self, name):  # noqa: D105
-        attr = super(MongoCollection, self).__getattr__(name)
-        if isinstance(attr, Collection):
-            db = self._Collection__database
-            return MongoCollection(db, attr.name)
-        return attr
+        if name.startswith('_'):
+            return super(MongoCollection, self).__getattr__(name)
+        return self[name]
 
     def __getitem__(self, item):  # noqa: D105
-        item_ = super(MongoCollection, self).__getitem__(item)
-        if isinstance(item_, Collection):
-            db = self._Collection__database
-            return MongoCollection(db, item_.name)
-        return item_
+        cache = wrapper_cache(self)
+        collection = cache.get(item)
+        if collection is None:
+            collection = cache.put(item, MongoCollection(
+                self.database, f'{self.name}.{item}', False, self.codec_options, self.read_preference,
+                self.write_concern, self.read_concern
+            ))
+        return collection
@@ -1,2 +1,4 @@
 from .exceptions import PyVersionInvalid, URIMissing, DatabaseException, CollectionException, CollectionInvalid, \
-    ValidationError, ValidatorsException, MissingFieldsException, InvalidClass, RegistrationException
+    ValidationError, ValidatorsException, MissingFieldsException, InvalidClass, RegistrationException, \
+    FieldException, DocumentException, FlushException, PaginationException, \
+    ConcurrencyException
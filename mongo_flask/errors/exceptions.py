@@ -38,8 +38,8 @@ class PyVersionInvalid(BaseMongoException):
 
 class URIMissing(BaseMongoException):
     status_code = 2
-    message = 'MONGO_HOST and MONGO_PORT are required in configuration'
-    fix = 'Include MONGO_HOST and MONGO_PORT in configuration'
+    message = 'MONGO_URI, or MONGO_HOST and MONGO_PORT, are required in configuration'
+    fix = 'Include MONGO_URI, or MONGO_HOST and MONGO_PORT, in configuration'
 
 
 class DatabaseException(BaseMongoException):
@@ -100,3 +100,37 @@ class RegistrationException(BaseMongoException):
     status_code = 10
     message = 'Unable to register collection'
     fix = 'Try again later'
+
+
+class FieldException(BaseMongoException):
+    status_code = 11
+    message = 'Field is not declared in the collection'
+    fix = 'Use a field declared in the CollectionModel class'
+
+
+class DocumentException(BaseMongoException):
+    status_code = 12
+    message = 'Document does not have an _id'
+    fix = 'Use a document retrieved from the collection'
+
+
+class FlushException(BaseMongoException):
+    status_code = 13
+    message = 'Dirty documents could not be written'
+    fix = 'Check the write errors in the results of the flush'
+
+    def __init__(self, results=None, message=None, fix=None):
+        self.results = results or []
+        super().__init__(message=message, fix=fix)
+
+
+class PaginationException(BaseMongoException):
+    status_code = 14
+    message = 'Pagination token is not valid'
+    fix = 'Use the next_token of a page of the same query'
+
+
+class ConcurrencyException(BaseMongoException):
+    status_code = 15
+    message = 'Document was changed or deleted since it was loaded'
+    fix = 'Load the document again and reapply the changes'
@@ -1,11 +1,62 @@
+import asyncio
+import os
+import threading
+import weakref
+
 from flask import Flask
-from pymongo.errors import OperationFailure
+from pymongo.errors import OperationFailure, ConfigurationError
 
 from .core.wrappers import MongoConnect, MongoDatabase
+from .core.asynchronous import AsyncCollectionModel
 from .core.collections import CollectionModel
+from .core.identity import drop_identity_map, flush_identity_map
+from .core.monitoring import QueryMonitor, add_query_stats_headers
+from .core.parallel import DEFAULT_POOL_SIZE, QueryPool
 from .errors import DatabaseException, CollectionException, CollectionInvalid, InvalidClass, RegistrationException, \
     URIMissing
 
+# Flask configuration keys forwarded to the MongoClient, with the client option they set
+CLIENT_CONFIG_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGO_MAX_CONNECTING': 'maxConnecting',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGO_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    'MONGO_COMPRESSORS': 'compressors',
+    'MONGO_ZLIB_COMPRESSION_LEVEL': 'zlibCompressionLevel',
+    'MONGO_READ_PREFERENCE': 'readPreference',
+    'MONGO_READ_CONCERN_LEVEL': 'readConcernLevel',
+    'MONGO_WRITE_CONCERN': 'w',
+    'MONGO_WRITE_CONCERN_TIMEOUT_MS': 'wTimeoutMS',
+    'MONGO_JOURNAL': 'journal',
+    'MONGO_RETRY_WRITES': 'retryWrites',
+    'MONGO_RETRY_READS': 'retryReads',
+    'MONGO_APP_NAME': 'appname',
+}
+
+# MongoFlask instances whose client is replaced in the child process after a fork
+_instances = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for instance in list(_instances):
+        instance._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _start(generator):
+    # Runs an async generator to its first `yield`, which registers it with the running loop for finalization
+    try:
+        generator.asend(None).send(None)
+    except StopIteration:
+        pass
+
 
 class MongoFlask(object):
     def __init__(self, app=None):
@@ -25,6 +76,16 @@ class MongoFlask(object):
         self.__client = None  # MongoDB client
         self.__db = None  # Application database
         self.__collections = {}  # Database collections
+        self.__uri = None  # Connection string of the client
+        self.__client_options = {}  # Keyword arguments of the client
+        self.__pid = None  # Process that created the client
+        self.__monitor = None  # Command listener of the clients, when MONGO_MONITORING is set
+        self.__index_reports = {}  # Collection name to the IndexReport of its registration
+        self.__ensure_indexes = True  # Reconcile the declared indexes when a collection is registered
+        self.__indexes_dry_run = False  # Only report the index differences
+        self.__async_clients = {}  # Event loop to its (async client, async database, async collections, closer)
+        self.__async_lock = threading.Lock()  # Async views of several threads share __async_clients
+        self.__query_pool = None  # Thread pool of `gather`
 
         if app:
             # App is initialized if sent as parameter else, init_app 
@@ -33,47 +94,241 @@ class MongoFlask(object):
 
     @property
     def client(self):
+        self.__check_process()
         return self.__client
 
     @property
     def db(self):
+        self.__check_process()
         return self.__db
 
     @property
     def collections(self):
         return self.__collections
 
+    @property
+    def monitor(self):
+        return self.__monitor
+
+    @property
+    def index_reports(self):
+        return self.__index_reports
+
+    @property
+    def query_pool(self) -> QueryPool:
+        """
+        Thread pool that runs the queries of `gather`, of MONGO_QUERY_POOL_SIZE threads.
+        """
+        self.__check_process()
+        return self.__query_pool
+
+    @property
+    def async_client(self):
+        """
+        Asynchronous client of the running event loop, see `get_async_collection`.
+        """
+        return self.__async_state()[0]
+
+    @property
+    def async_db(self):
+        """
+        Application database on the asynchronous client of the running event loop.
+        """
+        return self.__async_state()[1]
+
     def init_app(self, app):
         """
         Initializes the application. Flask instance MUST have at least the 
-        MONGO_HOST, MONGO_PORT, and MONGO_DATABASE in the application configuration. 
-        Username and password are optional. If database name is provided, it is also 
-        initialized.
+        MONGO_HOST, MONGO_PORT, and MONGO_DATABASE in the application configuration,
+        or a MONGO_URI. When MONGO_URI is given, MONGO_DATABASE defaults to the
+        database of the URI. Username and password are optional. If database name
+        is provided, it is also initialized.
+
+        The client is tuned with the keys of CLIENT_CONFIG_OPTIONS (pool size, timeouts,
+        compressors, read and write concerns) and MONGO_CLIENT_OPTIONS, a dictionary
+        of any other MongoClient keyword arguments.
+
+        Set MONGO_CONNECT to False under pre-fork servers (gunicorn or uWSGI with
+        preload): the client then connects on first use instead of when the app is
+        built. In every mode, a forked child process replaces the inherited client
+        with a new one, see `reset_client`.
+
+        Set MONGO_IDENTITY_MAP to keep one object per loaded document in each application
+        context, see `IdentityMap`, and MONGO_IDENTITY_MAP_FLUSH to write the documents
+        marked dirty at the end of each request.
+
+        Set MONGO_MONITORING to record every command with a `QueryMonitor`: the totals of
+        each request are returned by `get_query_stats()`, MONGO_QUERY_STATS_HEADERS adds
+        them to the responses, MONGO_SLOW_QUERY_MS logs the slow commands and
+        MONGO_QUERY_SINKS is a list of callables that receive each command record.
+
+        MONGO_QUERY_POOL_SIZE is the number of queries `gather` runs at the same time, 4 by
+        default. Keep it at or below MONGO_MAX_POOL_SIZE.
+
+        Registering a collection creates the indexes it declares, see
+        `BaseCollection.ensure_indexes`. Set MONGO_INDEXES_DRY_RUN to only report the
+        differences in `index_reports`, or MONGO_ENSURE_INDEXES to False to skip them.
 
         :param app: Flask instance of the application
         :type app: Flask
         """
-        host = app.config.get('MONGO_HOST')
-        port = app.config.get('MONGO_PORT')
-        username = app.config.get('MONGO_USER')
-        pwd = app.config.get('MONGO_PWD')
+        uri = app.config.get('MONGO_URI')
         db_name = app.config.get('MONGO_DATABASE')
 
-        if not host or not port:
-            raise URIMissing(
-                message=f'MONGO_HOST and MONGO_PORT cannot be "{type(None)}"',
-                fix='Provide a valid MONGO_HOST and MONGO_PORT value'
-            )
+        if not uri:
+            host = app.config.get('MONGO_HOST')
+            port = app.config.get('MONGO_PORT')
+            username = app.config.get('MONGO_USER')
+            pwd = app.config.get('MONGO_PWD')
 
-        account = f'{username}:{pwd}@' if username and pwd else ''
-        conn = f'{host}:{port}'
-        uri = f'mongodb://{account}{conn}'
-        
-        self.__client = MongoConnect(uri)
+            if not host or not port:
+                raise URIMissing(
+                    message=f'MONGO_URI, or MONGO_HOST and MONGO_PORT, cannot be "{type(None)}"',
+                    fix='Provide a valid MONGO_URI, or MONGO_HOST and MONGO_PORT values'
+                )
+
+            account = f'{username}:{pwd}@' if username and pwd else ''
+            conn = f'{host}:{port}'
+            uri = f'mongodb://{account}{conn}'
+
+        self.__uri = uri
+        self.__client_options = self._client_options(app.config)
+        self.__monitor = self._query_monitor(app.config)
+        if self.__monitor is not None:
+            listeners = list(self.__client_options.get('event_listeners') or ())
+            self.__client_options['event_listeners'] = listeners + [self.__monitor]
+        self.__ensure_indexes = app.config.get('MONGO_ENSURE_INDEXES', True)
+        self.__indexes_dry_run = app.config.get('MONGO_INDEXES_DRY_RUN', False)
+        if self.__query_pool is not None:
+            self.__query_pool.shutdown(wait=False)
+        self.__query_pool = QueryPool(app.config.get('MONGO_QUERY_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.__connect_client(connect=app.config.get('MONGO_CONNECT', True))
+        if not db_name and app.config.get('MONGO_URI'):
+            db_name = self._default_database_name()
         self.__database__(db_name)
+        _instances.add(self)
         
         if isinstance(app, Flask):  # Makes the package available to non-Flask projects
             app.mongo = self  # Create mongo attribute in Flask instance
+            if drop_identity_map not in app.teardown_appcontext_funcs:
+                app.after_request(add_query_stats_headers)
+                app.after_request(flush_identity_map)
+                app.teardown_appcontext(drop_identity_map)
+
+    @staticmethod
+    def _client_options(config) -> dict:
+        """
+        Builds the MongoClient keyword arguments from the application configuration.
+        """
+        options = {}
+        for config_key, option in CLIENT_CONFIG_OPTIONS.items():
+            value = config.get(config_key)
+            if value is not None:
+                options[option] = value
+        compressors = options.get('compressors')
+        if isinstance(compressors, (list, tuple)):
+            options['compressors'] = ','.join(compressors)
+        options.update(config.get('MONGO_CLIENT_OPTIONS') or {})
+        options.pop('connect', None)  # Set by MONGO_CONNECT
+        return options
+
+    @staticmethod
+    def _query_monitor(config):
+        """
+        Builds the command listener from the application configuration, None when MONGO_MONITORING is not set.
+        """
+        if not config.get('MONGO_MONITORING'):
+            return None
+        return QueryMonitor(slow_ms=config.get('MONGO_SLOW_QUERY_MS'), sinks=config.get('MONGO_QUERY_SINKS') or (),
+                            measure_bytes=config.get('MONGO_MONITOR_BYTES', False))
+
+    def __connect_client(self, connect=True):
+        self.__client = MongoConnect(self.__uri, connect=connect, **self.__client_options)
+        self.__pid = os.getpid()
+
+    def __check_process(self):
+        # Safety net for forks that did not run the at-fork hooks
+        if self.__client is not None and self.__pid != os.getpid():
+            self._reset_after_fork()
+
+    def reset_client(self, close=False):
+        """
+        Replaces the client with a new one that connects on first use, and rebinds the
+        database and every registered collection to it, so references to them keep
+        working. The child process gets the same reset automatically after a fork; it can
+        also be called from a server hook, e.g. gunicorn's `post_fork`.
+
+        :param close: Close the old client. Leave it False in a forked child, where the
+            old client belongs to the parent process.
+        :type close: bool
+        """
+        if self.__client is None:
+            return
+        with self.__async_lock:
+            self.__async_clients.clear()
+        self.__replace_client(close)
+
+    def _reset_after_fork(self):
+        """
+        `reset_client` of the child process after a fork. A lock held by another thread of the parent at the time of
+        the fork stays locked forever in the child, so the async client lock and dictionary are replaced instead of
+        acquired.
+        """
+        self.__async_lock = threading.Lock()
+        self.__async_clients = {}
+        if self.__client is not None:
+            self.__replace_client(close=False)
+
+    def __replace_client(self, close):
+        old_client = self.__client
+        if self.__query_pool is not None:  # The threads of the pool do not survive a fork
+            self.__query_pool = QueryPool(self.__query_pool.max_workers)
+        self.__connect_client(connect=False)
+        if self.__db is not None:
+            self.__db = MongoDatabase(self.__client, self.__db.name)
+            for collection in self.__collections.values():
+                collection.rebind(self.__db)
+        if close:
+            old_client.close()
+
+    def __async_state(self):
+        # An asynchronous client is bound to the event loop that first uses it, so each loop gets its own
+        self.__check_process()
+        loop = asyncio.get_running_loop()
+        with self.__async_lock:
+            state = self.__async_clients.get(loop)
+            if state is not None:
+                return state
+            # Loops closed without shutting down their async generators, whose clients cannot be closed any more
+            for closed in [other for other in self.__async_clients if other.is_closed()]:
+                del self.__async_clients[closed]
+            from pymongo import AsyncMongoClient  # Requires pymongo 4.13 or newer
+            client = AsyncMongoClient(self.__uri, **self.__client_options)
+            # The loop only keeps a weak reference to the closer, the state keeps it alive
+            closer = self.__close_with_loop(loop, client)
+            state = self.__async_clients[loop] = (client, client[self.__db.name], {}, closer)
+        _start(closer)
+        return state
+
+    async def __close_with_loop(self, loop, client):
+        """
+        Closes `client` when `loop` shuts down. A loop finalizes its pending async generators when it shuts down, as
+        `asyncio.run` and the loops Flask runs async views in do, so the client closes its connections and monitor
+        tasks in the loop they belong to.
+        """
+        try:
+            yield
+        finally:
+            with self.__async_lock:
+                if self.__async_clients.get(loop, (None,))[0] is client:
+                    del self.__async_clients[loop]
+            await client.close()
+
+    def _default_database_name(self):
+        try:
+            return self.__client.get_default_database().name
+        except ConfigurationError:
+            return None
 
     def __database__(self, db_name=None):
         """
@@ -85,7 +340,7 @@ class MongoFlask(object):
         if db_name is None:
             raise DatabaseException()
 
-        self.__db = MongoDatabase(self.client, db_name)
+        self.__db = MongoDatabase(self.__client, db_name)
 
     def register_collection(self, collection_cls):
         """
@@ -102,6 +357,8 @@ class MongoFlask(object):
         _collection.client_session = self.__client.start_session
         if not success:
             raise RegistrationException()
+        if self.__ensure_indexes and (_collection._indexes or self.__indexes_dry_run):
+            self.__index_reports[_name] = _collection.ensure_indexes(dry_run=self.__indexes_dry_run)
         self.__update_app()
         return success
 
@@ -136,6 +393,42 @@ class MongoFlask(object):
             raise CollectionException(message='A collection name is required')
 
         collection_to_return = self.collections.get(collection_name)
-        if not collection_to_return:
+        if collection_to_return is None:
             raise CollectionInvalid()
         return collection_to_return
+
+    def get_async_collection(self, collection_name=None) -> AsyncCollectionModel:
+        """
+        Retrieves the asynchronous counterpart of a registered collection, bound to the
+        asynchronous client of the running event loop. It must be called from a coroutine,
+        e.g. an `async def` view.
+
+        :param collection_name: Name of the collection to be retrieved
+        :type collection_name: str
+        """
+        collection = self.get_collection(collection_name)
+        _, database, async_collections, _ = self.__async_state()
+        async_collection = async_collections.get(collection_name)
+        if async_collection is None:
+            async_collection = AsyncCollectionModel(collection.__class__, database, collection.query_cache)
+            async_collections[collection_name] = async_collection
+        return async_collection
+
+    def gather(self, *queries, timeout=None, return_exceptions=False) -> list:
+        """
+        Runs independent queries at the same time in the `query_pool` and returns their results in the same order.
+        Each query is a callable without arguments; lazy DocumentSets returned by the queries are loaded in the pool.
+
+            users, total, latest = mongo.gather(
+                lambda: users_collection.filter(active=True),
+                lambda: orders_collection.count(status='open'),
+                lambda: orders_collection.all().order_by('-created').limit(10),
+                timeout=2,
+            )
+
+        :param timeout: Seconds the MongoDB operations of each query may take, see `QueryPool.submit`
+        :type timeout: float
+        :param return_exceptions: Return the errors of the failed queries instead of raising the first one
+        :type return_exceptions: bool
+        """
+        return self.query_pool.gather(*queries, timeout=timeout, return_exceptions=return_exceptions)
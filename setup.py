@@ -11,13 +11,22 @@ setup(
     author_email=None,
     license='BSD-2-Clause License',
     packages=['mongo_flask', 'mongo_flask.core', 'mongo_flask.errors'],
-    install_requires=['flask', 'pymongo'],
+    python_requires='>=3.9',
+    install_requires=['flask', 'pymongo>=4.13'],
+    extras_require={
+        'numpy': ['numpy'],
+        'arrow': ['pyarrow'],
+        'benchmarks': ['pytest', 'pytest-benchmark', 'mongomock'],
+    },
     classifiers=[
         'Development Status :: 2 - Development',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Operating System :: OS Independent',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ]
 )
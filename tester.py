@@ -1,11 +1,27 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
 import pytest
-from flask import Flask
+from flask import Flask, current_app
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import InvalidOperation
 
-from mongo_flask import MongoFlask
+from mongo_flask import MongoFlask, stream_json
 from mongo_flask.core.wrappers import MongoConnect, MongoDatabase
+from mongo_flask.core.asynchronous import AsyncCollectionModel, AsyncDocumentSet
 from mongo_flask.core.collections import CollectionModel
-from mongo_flask.core.fields import StringField, IntegerField
-from mongo_flask.core.document import Document, DocumentSet
+from mongo_flask.core.fields import BaseField, DateField, StringField, IntegerField
+from mongo_flask.core.batch import BatchValidation
+from mongo_flask.core.columns import arrow_column, numpy_column
+from mongo_flask.core.document import Document, DocumentSet, LazyDocumentSet, RawDocument
+from mongo_flask.core.results import BulkOperationResult, BulkInsertResult
+from mongo_flask.core.identity import get_identity_map
+from mongo_flask.core.monitoring import QueryMonitor, get_query_stats
+from mongo_flask.core.aggregation import Aggregation
 from mongo_flask.errors.exceptions import *
 
 app = Flask(__name__)
@@ -27,6 +43,31 @@ class Testing2(CollectionModel):
     age = IntegerField()
 
 
+class IndexedTesting2(Testing2):
+    # The 'testing2' collection with declared indexes
+    age = IntegerField(index=True)
+    indexes = (IndexModel([('last_name', ASCENDING), ('first_name', ASCENDING)], name='full_name'),)
+
+
+class VersionedTesting2(Testing2):
+    # The 'testing2' collection with optimistic concurrency
+    version_field = 'version'
+    version = IntegerField()
+
+
+class UniqueVersionedTesting(CollectionModel):
+    # A collection with optimistic concurrency and a unique field
+    collection_name = 'testing_versions'
+    version_field = 'version'
+    code = IntegerField(unique=True)
+    version = IntegerField()
+
+
+class RawTesting2(Testing2):
+    # The 'testing2' collection read as raw BSON
+    raw_documents = True
+
+
 class Testing3(CollectionModel):
     # A collection that does not exist
     collection_name = None
@@ -35,6 +76,26 @@ class Testing3(CollectionModel):
     height = IntegerField()
 
 
+class CachedTesting(Testing):
+    # The 'testing' collection with the query cache enabled
+    cache_size = 8
+
+
+class TaggedTesting2(Testing2):
+    # The 'testing2' collection with a list field
+    tags = BaseField()
+
+
+class RawTaggedTesting2(TaggedTesting2):
+    # The 'testing2' collection with a list field, read as raw BSON
+    raw_documents = True
+
+
+class CachedTesting2(TaggedTesting2):
+    # The 'testing2' collection with a list field and the query cache enabled
+    cache_size = 8
+
+
 class AnInvalidCollection:
     # The name says it all
     collection_name = 'i_am_invalid'
@@ -82,6 +143,27 @@ def test_missing_database():
         mongo.init_app(app)
 
 
+def test_client_options_from_config():
+    temp = app_config(temp=Flask(__name__), init=False)
+    temp.config['MONGO_MAX_POOL_SIZE'] = 20
+    temp.config['MONGO_MIN_POOL_SIZE'] = 2
+    temp.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'] = 500
+    temp.config['MONGO_COMPRESSORS'] = ['zlib']
+    temp.config['MONGO_WRITE_CONCERN'] = 'majority'
+    mongo.init_app(temp)
+    pool_options = mongo.client.options.pool_options
+    assert pool_options.max_pool_size == 20 and pool_options.min_pool_size == 2
+    assert pool_options.wait_queue_timeout == 0.5
+    assert mongo.client.write_concern.document == {'w': 'majority'}
+
+
+def test_client_from_uri():
+    temp = Flask(__name__)
+    temp.config['MONGO_URI'] = 'mongodb://localhost:27017/mongo_flask?maxPoolSize=10'
+    mongo.init_app(temp)
+    assert mongo.db.name == 'mongo_flask' and mongo.client.options.pool_options.max_pool_size == 10
+
+
 # Testing MongoFlask attributes types
 def test_app_mongo():
     app_config()
@@ -100,6 +182,37 @@ def test_database_type():
     assert isinstance(mongo.db, MongoDatabase)
 
 
+def test_wrappers_are_cached():
+    app_config()
+    assert mongo.client.mongo_flask is mongo.client['mongo_flask']
+    assert mongo.db.testing is mongo.db['testing'] and mongo.db.testing.sub is mongo.db.testing['sub']
+
+
+def test_wrapper_cache_shared_by_threads():
+    database = MongoDatabase(MongoConnect(connect=False), 'threads')
+    errors = []
+
+    def access(offset):
+        try:
+            for number in range(40000):  # More names than the cache keeps, so wrappers are evicted all the time
+                database[f'c{(number * 7 + offset) % 130}']
+        except KeyError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=access, args=(offset,)) for offset in range(8)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads often, so they interleave inside the cache
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+        database.client.close()
+    assert errors == []
+
+
 def test_collection_type():
     app_config()
     assert isinstance(mongo.collections, dict)
@@ -128,6 +241,62 @@ def test_collection_registration_invalid():
         mongo.register_collection(AnInvalidCollection)
 
 
+def test_query_monitoring():
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_MONITORING'] = True
+    temp.config['MONGO_QUERY_STATS_HEADERS'] = True
+    mongo.init_app(temp)
+    records = []
+    mongo.monitor.add_sink(records.append)
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+
+    @temp.get('/documents')
+    def documents():
+        count = len(collection.filter(desc='this is a test document'))
+        return {'count': count, 'queries': get_query_stats().count}
+
+    response = temp.test_client().get('/documents')
+    assert isinstance(mongo.monitor, QueryMonitor) and response.json['queries'] >= 1
+    assert int(response.headers['X-Mongo-Queries']) == response.json['queries']
+    assert any(record.command_name == 'find' and record.collection == 'testing' and record.documents > 0
+               for record in records)
+
+
+def test_collection_registration_index_dry_run():
+    temp = app_config(init=False)
+    temp.config['MONGO_INDEXES_DRY_RUN'] = True
+    mongo.init_app(temp)
+    temp.config.pop('MONGO_INDEXES_DRY_RUN')
+    register_collection_for_test(IndexedTesting2)
+    report = mongo.index_reports['testing2']
+    assert report.dry_run and sorted(report.missing_names) == ['age_1', 'full_name'] and not report.created
+
+
+def test_collection_ensure_indexes():
+    app_config()
+    collection = IndexedTesting2(mongo.db)
+    report = collection.ensure_indexes()
+    assert sorted(report.created) == ['age_1', 'full_name'] and collection.ensure_indexes().in_sync
+    collection.drop_index('age_1')
+    collection.drop_index('full_name')
+
+
+def test_collection_index_on_undeclared_field():
+    with pytest.raises(FieldException):
+        class InvalidIndexes(Testing2):
+            indexes = (IndexModel([('height', ASCENDING)]),)
+
+
+def test_collection_field_shadowing_attribute():
+    with pytest.raises(FieldException):
+        class ShadowingName(Testing2):
+            name = StringField()  # pymongo builds the write commands with Collection.name
+    with pytest.raises(FieldException):
+        class ShadowingMethod(Testing2):
+            count = IntegerField()
+
+
 def test_get_collection():
     app_config()
     register_collection_for_test()
@@ -149,6 +318,53 @@ def test_get_collection_does_not_exist():
         mongo.get_collection('not_a_good_collection_name')
 
 
+def test_reset_client_rebinds_collections():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    old_client = mongo.client
+    mongo.reset_client()
+    assert mongo.client is not old_client
+    assert collection.database.client is mongo.client and mongo.db.client is mongo.client
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Requires os.fork')
+def test_client_replaced_after_fork():
+    temp = app_config(init=False)
+    temp.config['MONGO_CONNECT'] = False
+    mongo.init_app(temp)
+    temp.config.pop('MONGO_CONNECT')
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    parent_client = mongo.client
+    pid = os.fork()
+    if pid == 0:  # Child process
+        os._exit(0 if collection.database.client is not parent_client else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0 and mongo.client is parent_client
+
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Requires os.fork')
+def test_fork_while_async_lock_held():
+    import time
+    app_config()
+    parent_client = mongo.client
+    # As if another thread were creating an async client at the time of the fork
+    with mongo._MongoFlask__async_lock:
+        pid = os.fork()
+        if pid == 0:  # Child process, the at-fork hook would wait for the lock forever if it acquired it
+            os._exit(0 if mongo.client is not parent_client else 1)
+    for _ in range(100):
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        time.sleep(0.05)
+    else:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+    assert done and os.WEXITSTATUS(status) == 0
+
 # Collection level operation tests
 def test_collection_method_all():
     app_config()
@@ -176,7 +392,199 @@ def test_collection_method_filter():
     register_collection_for_test()
     collection = mongo.get_collection('testing')
     docu_set = collection.filter(desc='this is a test document')
-    assert isinstance(docu_set, DocumentSet) and isinstance(docu_set[0]['desc'], StringField)
+    assert isinstance(docu_set, DocumentSet) and isinstance(docu_set[0]['desc'], str)
+    assert isinstance(docu_set[0].field('desc'), StringField)
+
+
+def test_collection_documents_hold_own_values():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    first, second = collection.all().order_by('doc_num')[:2]
+    assert first['doc_num'] != second['doc_num']
+    assert isinstance(first, Testing.document_class)
+
+
+def test_collection_method_all_is_lazy():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    docu_set = collection.all()
+    streamed = [document for document in docu_set]
+    assert isinstance(docu_set, LazyDocumentSet) and not docu_set.materialized
+    assert all(isinstance(document, Document) for document in streamed)
+
+
+def test_collection_method_filter_materializes_on_len():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    docu_set = collection.filter(desc='this is a test document')
+    assert len(docu_set) == collection.count_documents({'desc': 'this is a test document'})
+    assert docu_set.materialized and len(docu_set[:1]) == 1
+
+
+def test_collection_method_find_limit():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    docu_set = collection.find_limit(2)
+    assert isinstance(docu_set, DocumentSet) and len(docu_set) == 2
+
+
+def test_collection_query_options():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    docu_set = collection.all().order_by('-doc_num').skip(1).limit(3).only('doc_num')
+    assert len(docu_set) == 3
+
+
+def test_collection_to_columns():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    columns = collection.filter(desc='this is a test document').order_by('doc_num').to_columns('doc_num', '_id')
+    assert list(columns) == ['doc_num', '_id'] and len(columns['_id']) == len(columns['doc_num'])
+    assert columns['doc_num'] == sorted(columns['doc_num']) and 'doc0' in columns['doc_num']
+    with pytest.raises(FieldException):
+        collection.all().to_columns('not_a_field')
+
+
+def test_collection_to_numpy():
+    numpy = pytest.importorskip('numpy')
+    app_config()
+    collection = Testing2(mongo.db)
+    inserted = collection.insert_many([{'first_name': 'John', 'age': 30}, {'first_name': 'Jane'}])
+    columns = collection.filter(first_name={'$in': ['John', 'Jane']}).order_by('first_name').to_numpy('age',
+                                                                                                      'first_name')
+    assert columns['age'].dtype == numpy.int64 and columns['age'].mask.tolist() == [True, False]
+    assert columns['first_name'].tolist() == ['Jane', 'John']
+    collection.delete_many({'_id': {'$in': inserted.inserted_ids}})
+
+
+def test_numpy_column_mixed_types():
+    numpy = pytest.importorskip('numpy')
+    column = numpy_column(IntegerField(), [1, 2.7, '12'])
+    assert column.dtype == object and column.tolist() == [1, 2.7, '12']
+    assert numpy_column(IntegerField(), [1, True]).dtype == object
+    column = numpy_column(DateField(), [datetime(2024, 1, 1), '2024-01-02'])
+    assert column.dtype == object and column.tolist() == [datetime(2024, 1, 1), '2024-01-02']
+    assert numpy_column(IntegerField(), [1, None, 2 ** 70]).dtype == object
+    assert numpy_column(DateField(), [datetime(2024, 1, 1), None]).dtype == numpy.dtype('datetime64[ms]')
+
+
+def test_arrow_column_mixed_types():
+    pyarrow = pytest.importorskip('pyarrow')
+    assert arrow_column(IntegerField(), [1, None]).type == pyarrow.int64()
+    assert arrow_column(IntegerField(), [1, 2.7]).to_pylist() == [1.0, 2.7]
+    assert arrow_column(IntegerField(), [1, 2.7, '12', None]).to_pylist() == ['1', '2.7', '12', None]
+    assert arrow_column(DateField(), [datetime(2024, 1, 1), '2024-01-02']).type == pyarrow.string()
+
+
+def test_stream_json():
+    temp = app_config(Flask(__name__))
+    collection = Testing(mongo.db)
+
+    @temp.get('/documents')
+    def documents():
+        return stream_json(collection.filter(desc='this is a test document').order_by('doc_num'), chunk_size=100)
+
+    @temp.get('/documents.ndjson')
+    def documents_ndjson():
+        return stream_json(collection.filter(desc='this is a test document'), ndjson=True)
+
+    response = temp.test_client().get('/documents')
+    assert response.is_streamed and response.mimetype == 'application/json'
+    documents = response.get_json()
+    assert len(documents) == collection.count(desc='this is a test document')
+    assert documents[0]['doc_num'] == 'doc0' and '$oid' in documents[0]['_id']
+    lines = temp.test_client().get('/documents.ndjson').get_data(as_text=True).splitlines()
+    assert len(lines) == len(documents) and json.loads(lines[0])['desc'] == 'this is a test document'
+
+
+def test_gather_queries():
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_QUERY_POOL_SIZE'] = 2
+    mongo.init_app(temp)
+    collection = Testing(mongo.db)
+    with temp.app_context():
+        documents, count, app_name = mongo.gather(lambda: collection.filter(desc='this is a test document'),
+                                                  lambda: collection.count(), lambda: current_app.name, timeout=5)
+        assert documents.materialized and len(documents) == count and app_name == temp.name
+        with pytest.raises(ZeroDivisionError):
+            mongo.gather(lambda: 1 / 0, collection.count)
+        error, count = mongo.gather(lambda: 1 / 0, collection.count, return_exceptions=True)
+        assert isinstance(error, ZeroDivisionError) and count == len(documents)
+    assert mongo.query_pool.max_workers == 2
+
+
+def test_collection_query_invalid_field():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    with pytest.raises(FieldException):
+        collection.all().order_by('not_a_field')
+
+
+def test_collection_aggregation():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    aggregation = collection.aggregation().match(desc='this is a test document').sort('-doc_num').limit(3)
+    documents = aggregation.batch_size(2).to_list()
+    assert isinstance(aggregation, Aggregation) and len(documents) == 3
+    assert all(isinstance(document, Testing.document_class) for document in documents)
+    expected = [document['doc_num'] for document in collection.all().order_by('-doc_num')[:3]]
+    assert [document['doc_num'] for document in documents] == expected
+
+
+def test_collection_aggregation_group():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    aggregation = collection.aggregation().group('$desc', total={'$sum': 1}).sort('-total').allow_disk_use()
+    groups = list(aggregation)
+    assert not aggregation.hydrates and sum(group['total'] for group in groups) == collection.count_documents({})
+    with pytest.raises(FieldException):
+        aggregation.match(doc_num='doc1')
+
+
+def test_collection_paginate():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    seen, token, pages = [], None, 0
+    while True:
+        page = collection.paginate(per_page=3, order_by='-doc_num', token=token, desc='this is a test document')
+        seen.extend(document._id for document in page)
+        pages += 1
+        if not page.has_next:
+            break
+        token = page.next_token
+    expected = [document._id for document in collection.filter(desc='this is a test document').order_by('-doc_num')]
+    assert seen == expected and pages == ((len(expected) + 2) // 3 or 1)
+
+
+def test_collection_paginate_invalid_token():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    token = collection.paginate(per_page=1, order_by='doc_num').next_token
+    with pytest.raises(PaginationException):
+        collection.paginate(per_page=1, order_by='desc', token=token)
+    with pytest.raises(PaginationException):
+        collection.paginate(per_page=1, token='not a token')
+
+
+def test_collection_count_and_exists():
+    app_config()
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    total = collection.count_documents({})
+    assert collection.count() == total and collection.estimated_count() == total
+    assert collection.count(desc='this is a test document') == len(collection.filter(desc='this is a test document'))
+    assert collection.exists(desc='this is a test document') and not collection.exists(doc_num='not a document')
 
 
 def test_collection_method_get():
@@ -184,7 +592,8 @@ def test_collection_method_get():
     register_collection_for_test()
     collection = mongo.get_collection('testing')
     document = collection.get(doc_num='doc0')
-    assert isinstance(document, Document) and isinstance(document.get('doc_num'), StringField)
+    assert isinstance(document, Document) and document.get('doc_num') == 'doc0'
+    assert isinstance(document.field('doc_num'), StringField)
 
 
 def test_collection_method_get_empty():
@@ -195,9 +604,403 @@ def test_collection_method_get_empty():
     assert isinstance(document, Document)
 
 
+def test_collection_query_cache():
+    app_config()
+    collection = CachedTesting(mongo.db)
+    first, second = collection.get(desc='this is a test document'), collection.get(desc='this is a test document')
+    assert first._id == second._id and first is not second
+    streamed = [list(collection.filter(desc='this is a test document')) for _ in range(2)]
+    assert [document._id for document in streamed[0]] == [document._id for document in streamed[1]]
+    assert collection.query_cache.hits == 2 and collection.query_cache.misses == 2
+
+
+def test_collection_query_cache_invalidated_by_writes():
+    app_config()
+    collection = CachedTesting(mongo.db)
+    count = len(list(collection.all()))
+    result = collection.insert_one(doc_num='cached', desc='a cached document')
+    assert len(collection.query_cache) == 0 and len(list(collection.all())) == count + 1
+    collection.delete_one(collection.get(doc_num='cached'))
+    assert len(list(collection.all())) == count and result.inserted_id
+
+
+def test_collection_query_cache_returns_copies():
+    app_config()
+    collection = CachedTesting2(mongo.db)
+    inserted = collection.insert_one(first_name='Tagged', tags=['x'])
+    collection.get(first_name='Tagged')['tags'].append('local-only')
+    for document in collection.filter(first_name='Tagged'):
+        document['tags'].append('local-only')
+    assert collection.get(first_name='Tagged')['tags'] == ['x']
+    assert [document['tags'] for document in collection.filter(first_name='Tagged')] == [['x']]
+    assert collection.query_cache.hits == 2
+    collection.delete_one(collection.get(_id=inserted.inserted_id))
+
+
+def test_identity_map_returns_loaded_documents():
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_IDENTITY_MAP'] = True
+    mongo.init_app(temp)
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    with temp.app_context():
+        document = collection.get(desc='this is a test document')
+        docu_set = collection.filter(desc='this is a test document')
+        assert collection.get(_id=document._id) is document and len(docu_set) > 0
+        assert any(loaded is document for loaded in docu_set)
+    with temp.app_context():
+        assert collection.get(_id=document._id) is not document and len(get_identity_map()) == 1
+
+
+def test_identity_map_same_objects_on_every_read():
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_IDENTITY_MAP'] = True
+    mongo.init_app(temp)
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    with temp.app_context():
+        docu_set = collection.filter(desc='this is a test document').order_by('doc_num')
+        partial = docu_set.only('doc_num')[0]
+        assert len(get_identity_map()) == 0  # Documents missing fields are not added to the map
+        document = collection.get(_id=partial._id)
+        assert document is not partial and document['desc'] == 'this is a test document'
+        assert docu_set.only('doc_num')[0] is document
+        streamed = [loaded for loaded in docu_set]
+        assert streamed[0] is document and len(get_identity_map()) == 1  # Streaming does not add documents
+        materialized = list(docu_set)
+        assert materialized[0] is document and len(get_identity_map()) == len(materialized)
+        assert all(a is b for a, b in zip(materialized, docu_set.order_by('doc_num')))
+
+
+def test_identity_map_follows_multiple_operation():
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_IDENTITY_MAP'] = True
+    mongo.init_app(temp)
+    register_collection_for_test()
+    collection = mongo.get_collection('testing')
+    collection.insert_one(doc_num='doc506', desc='Some text for test')
+    collection.insert_one(doc_num='doc507', desc='Some text for test')
+    stale = collection.get(doc_num='doc506')  # Outside the context, so not the document of the map
+    with temp.app_context():
+        loaded, deleted = collection.get(_id=stale._id), collection.get(doc_num='doc507')
+        collection.multiple_operation((
+            {'update_one': {'doc': stale, 'set': {'desc': 'Updated text for test'}}},
+            {'delete_one': deleted},
+        ))
+        assert loaded['desc'] == 'Updated text for test' and not loaded.has_changed
+        assert collection.get(_id=deleted._id)._id is None
+    collection.delete_one(stale)
+
+
+def test_identity_map_flushes_dirty_documents():
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_IDENTITY_MAP'] = True
+    temp.config['MONGO_IDENTITY_MAP_FLUSH'] = True
+    mongo.init_app(temp)
+    register_collection_for_test(Testing2)
+    collection = mongo.get_collection('testing2')
+    inserted = collection.insert_one(first_name='Dirty', last_name='Doe', age=1)
+
+    @temp.get('/birthday')
+    def birthday():
+        document = collection.get(_id=inserted.inserted_id)
+        document['age'] += 1
+        get_identity_map().mark_dirty(document)
+        return 'ok'
+
+    assert temp.test_client().get('/birthday').status_code == 200
+    document = collection.get(_id=inserted.inserted_id)
+    assert document['age'] == 2
+    collection.delete_one(document)
+
+
 def test_collection_method_insert_one():
     app_config()
     register_collection_for_test(Testing)
     collection = mongo.get_collection('testing')
     insert = collection.insert_one(doc_num='doc500', desc='Some text for test')
     assert insert.acknowledged
+
+
+def test_collection_document_has_server_id():
+    app_config()
+    register_collection_for_test(Testing)
+    collection = mongo.get_collection('testing')
+    document = collection.get(doc_num='doc0')
+    assert document._id == collection.find_one({'doc_num': 'doc0'})['_id']
+
+
+def test_collection_method_update_one():
+    app_config()
+    register_collection_for_test(Testing)
+    collection = mongo.get_collection('testing')
+    collection.insert_one(doc_num='doc501', desc='Some text for test')
+    document = collection.get(doc_num='doc501')
+    update = collection.update_one(document, {'desc': 'Updated text for test'})
+    assert update.matched_count == 1 and collection.get(doc_num='doc501')['desc'] == 'Updated text for test'
+    collection.delete_one(document)
+
+
+def test_document_save_changed_fields():
+    app_config()
+    register_collection_for_test(Testing2)
+    collection = mongo.get_collection('testing2')
+    inserted = collection.insert_one(first_name='John', last_name='Doe', age=30)
+    document = collection.get(_id=inserted.inserted_id)
+    assert not document.has_changed and document.save() is None
+    document['age'] = 31
+    del document['last_name']
+    assert document.changed_data() == {'age': 31} and document.removed_fields() == ['last_name']
+    assert document.save().modified_count == 1 and not document.has_changed
+    saved = collection.find_one({'_id': inserted.inserted_id})
+    assert saved['age'] == 31 and 'last_name' not in saved and saved['first_name'] == 'John'
+    collection.delete_one(document)
+
+
+def test_document_save_version_conflict():
+    app_config()
+    collection = VersionedTesting2(mongo.db)
+    inserted = collection.insert_one(first_name='John', age=30)
+    document, stale = collection.get(_id=inserted.inserted_id), collection.get(_id=inserted.inserted_id)
+    document['age'] = 31
+    document.save()
+    assert document['version'] == 1 and collection.get(_id=inserted.inserted_id)['version'] == 1
+    stale['age'] = 32
+    with pytest.raises(ConcurrencyException):
+        stale.save()
+    collection.delete_one(document)
+
+
+def test_document_save_in_place_changes():
+    app_config()
+    for collection in (TaggedTesting2(mongo.db), RawTaggedTesting2(mongo.db)):
+        inserted = collection.insert_one(first_name='Tagged', tags=['x'])
+        document = collection.get(_id=inserted.inserted_id)
+        document['tags'].append('y')
+        assert document.changed_data() == {'tags': ['x', 'y']}
+        document.save()
+        document['tags'].append('z')
+        assert document.changed_data() == {'tags': ['x', 'y', 'z']}
+        document.save()
+        assert collection.get(_id=inserted.inserted_id)['tags'] == ['x', 'y', 'z'] and not document.has_changed
+        collection.delete_one(document)
+
+
+def test_collection_save_many_ordered_write_error():
+    app_config()
+    collection = UniqueVersionedTesting(mongo.db)
+    collection.ensure_indexes()
+    collection.insert_many([{'code': code} for code in (1, 2, 3)])
+    documents = list(collection.all().order_by('code'))
+    for document, code in zip(documents, (10, 3, 30)):
+        document['code'] = code  # The second document takes the code of the third
+    result = collection.save_many(documents, ordered=True)
+    assert [error['index'] for error in result.write_errors] == [1] and result.matched_count == 1
+    assert not documents[0].has_changed and documents[1].has_changed and documents[2].has_changed
+    collection.drop()
+
+
+def test_raw_documents_decode_fields_on_access():
+    app_config()
+    collection = RawTesting2(mongo.db)
+    inserted = collection.insert_one(first_name='John', last_name='Doe', age=30)
+    document = collection.get(_id=inserted.inserted_id)
+    assert isinstance(document, RawDocument) and document._id == inserted.inserted_id
+    assert document['age'] == 30 and not document.decoded
+    document['age'] = 31
+    del document['last_name']
+    assert document.changed_data() == {'age': 31} and document.removed_fields() == ['last_name']
+    assert document.save().modified_count == 1 and not document.has_changed
+    assert document == {'first_name': 'John', 'age': 31} and document.decoded
+    assert collection.get(_id=inserted.inserted_id).cleaned_data == {'first_name': 'John', 'last_name': None,
+                                                                      'age': 31}
+    collection.delete_one(document)
+
+
+def test_collection_method_delete_one():
+    app_config()
+    register_collection_for_test(Testing)
+    collection = mongo.get_collection('testing')
+    collection.insert_one(doc_num='doc502', desc='Some text for test')
+    delete = collection.delete_one(collection.get(doc_num='doc502'))
+    assert delete.deleted_count == 1
+
+
+def test_collection_write_without_id():
+    app_config()
+    register_collection_for_test(Testing2)
+    collection = mongo.get_collection('testing2')
+    document = collection.get(first_name='nobody')
+    with pytest.raises(DocumentException):
+        collection.delete_one(document)
+
+
+def test_collection_multiple_operation():
+    app_config()
+    register_collection_for_test(Testing)
+    collection = mongo.get_collection('testing')
+    collection.insert_one(doc_num='doc503', desc='Some text for test')
+    document = collection.get(doc_num='doc503')
+    result = collection.multiple_operation((
+        {'insert_one': {'doc_num': 'doc504', 'desc': 'Some text for test'}},
+        {'update_one': {'doc': document, 'set': {'desc': 'Updated text for test'}}},
+        {'delete_one': document},
+    ))
+    assert isinstance(result, BulkOperationResult) and result.success
+    assert len(result.inserted_ids) == 1 and result.modified_count == 1 and result.deleted_count == 1
+    collection.delete_one(collection.get(doc_num='doc504'))
+
+
+def test_collection_multiple_operation_invalid():
+    app_config()
+    register_collection_for_test(Testing)
+    collection = mongo.get_collection('testing')
+    with pytest.raises(ValueError):
+        collection.multiple_operation(({'replace_one': {'doc_num': 'doc505'}},))
+
+
+def no_spaces(value):
+    if isinstance(value, str) and ' ' in value:
+        raise ValidationError(message='Value has spaces', fix='Remove the spaces')
+
+
+def test_field_validate_batch():
+    fields_and_values = (
+        (IntegerField(required=True, min_value=0, max_value=10), [1, None, 'two', 11, -1, 5, True]),
+        (StringField(validators=[no_spaces]), ['one', None, 'two words', 3, 'four']),
+        (DateField(min_value=datetime(2000, 1, 1)), [datetime(2001, 1, 1), 'x', None, datetime(1999, 1, 1), 5]),
+    )
+    for field, values in fields_and_values:
+        batch = field.validate_batch(values)
+        assert isinstance(batch, BatchValidation)
+        assert [bool(flag) for flag in batch.mask] == [bool(field.validate(value)) for value in values]
+        assert all(batch.errors[position] for position in batch.invalid_positions())
+
+
+def test_field_validate_batch_numpy():
+    numpy = pytest.importorskip('numpy')
+    batch = IntegerField(max_value=10).validate_batch(numpy.arange(20))
+    assert batch.invalid_count == 9 and batch.errors[19][0].message
+    assert StringField().validate_batch(numpy.arange(3)).invalid_count == 3
+    assert DateField().validate_batch(numpy.arange(3)).invalid_count == 3
+
+
+def test_collection_validate_columns():
+    app_config()
+    register_collection_for_test(Testing2)
+    collection = mongo.get_collection('testing2')
+    validations = collection.validate_columns({'first_name': ['John', 'Jane'], 'age': [30, 'thirty']})
+    assert validations['first_name'].valid and validations['age'].invalid_positions() == [1]
+    with pytest.raises(FieldException):
+        collection.validate_columns({'height': [180]})
+
+
+def test_collection_method_insert_many():
+    app_config()
+    register_collection_for_test(Testing2)
+    collection = mongo.get_collection('testing2')
+    rows = ({'first_name': 'John', 'last_name': 'Doe', 'age': age} for age in range(5))
+    result = collection.insert_many(rows, batch_size=2)
+    assert isinstance(result, BulkInsertResult) and result.success
+    assert result.inserted_count == 5 and result.batches == 3
+    collection.delete_many({'_id': {'$in': result.inserted_ids}})
+
+
+def test_collection_method_insert_many_invalid_rows():
+    app_config()
+    register_collection_for_test(Testing2)
+    collection = mongo.get_collection('testing2')
+    rows = [{'first_name': 'John', 'age': 'thirty'}, {'first_name': 'Jane', 'age': 30}, {'nickname': 'JJ'}]
+    result = collection.insert_many(rows)
+    assert result.inserted_count == 1 and sorted(result.invalid_rows) == [0, 2]
+    assert 'age' in result.invalid_rows[0] and 'nickname' in result.invalid_rows[2]
+    collection.delete_many({'_id': {'$in': result.inserted_ids}})
+
+
+# Asynchronous API tests
+@pytest.fixture
+def standin():
+    """
+    Routes the collection operations to the in-process stand-in of the benchmark suite and initializes `mongo` on it,
+    so the test runs without a server.
+    """
+    pytest.importorskip('mongomock')
+    from benchmarks import standin
+    standin.install()
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_CONNECT'] = False
+    mongo.init_app(temp)
+    yield standin
+    standin.uninstall()
+
+
+def test_get_async_collection(standin):
+    async def get():
+        return mongo.get_async_collection('testing'), mongo.async_client
+
+    register_collection_for_test()
+    async_collection, client = asyncio.run(get())
+    assert isinstance(async_collection, AsyncCollectionModel) and async_collection.model is Testing
+    assert isinstance(async_collection.all(), AsyncDocumentSet)
+    assert asyncio.run(get())[1] is not client  # Each event loop has its own client
+
+
+def test_async_client_closed_with_its_loop():
+    async def get():
+        return mongo.async_client
+
+    temp = app_config(Flask(__name__), init=False)
+    temp.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = 100
+    mongo.init_app(temp)
+    client = asyncio.run(get())
+    with pytest.raises(InvalidOperation):
+        asyncio.run(client.admin.command('ping'))
+
+
+def test_async_collection_queries(standin):
+    async def query():
+        collection = mongo.get_async_collection('testing')
+        for number in range(4):
+            await collection.insert_one(doc_num=f'async{number}', desc='an async document')
+        streamed = [document async for document in collection.filter(desc='an async document').limit(2)]
+        docu_set = await collection.filter(desc='an async document').order_by('doc_num')[:3]
+        document = await collection.get(doc_num=docu_set[0]['doc_num'])
+        await collection.collection.delete_many({'desc': 'an async document'})
+        return streamed, docu_set, document
+
+    register_collection_for_test()
+    streamed, docu_set, document = asyncio.run(query())
+    assert len(streamed) == 2 and isinstance(streamed[0], Testing.document_class)
+    assert isinstance(docu_set, DocumentSet) and len(docu_set) == 3
+    assert document._id == docu_set[0]._id and document['doc_num'] == 'async0'
+
+
+def test_async_writes_invalidate_query_cache(standin):
+    async def write(delete=False):
+        collection = mongo.get_async_collection('testing')
+        if delete:
+            await collection.delete_one(await collection.get(doc_num='async-cached'))
+        else:
+            await collection.insert_one(doc_num='async-cached', desc='an async document')
+
+    register_collection_for_test(CachedTesting)
+    collection = mongo.get_collection('testing')
+    assert list(collection.filter(doc_num='async-cached')) == [] and len(collection.query_cache) == 1
+    asyncio.run(write())
+    assert [document['doc_num'] for document in collection.filter(doc_num='async-cached')] == ['async-cached']
+    asyncio.run(write(delete=True))
+    assert list(collection.filter(doc_num='async-cached')) == []
+
+def test_async_collection_writes(standin):
+    async def write():
+        collection = mongo.get_async_collection('testing2')
+        await collection.insert_one(first_name='Async', last_name='Doe', age=30)
+        document = await collection.get(first_name='Async')
+        await collection.update_one(document, {'age': 31})
+        updated = await collection.get(first_name='Async')
+        await collection.delete_one(updated)
+        return updated, await collection.get(first_name='Async')
+
+    register_collection_for_test(Testing2)
+    updated, deleted = asyncio.run(write())
+    assert updated['age'] == 31 and deleted._id is None